@@ -2,311 +2,984 @@
 	LIGHT and DARK AI BOTS
 	Press 'A' on the keyboard to activate/deactivate AI mode (Light VS Dark)
 """
-import random
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from math import inf
-from engine import Move
+from book import Opening_book
+from hash_table import Hash_table
+from tablebase import Tablebase
+from engine import Game_state, Move, FROM_TO, MAX_PHASE, FILE_A, FULL_BOARD, piece_values
+
+# default size of the transposition table in megabytes
+TRANSPOSITION_TABLE_MB = 16
+# default size of the pawn hash table in megabytes
+PAWN_HASH_TABLE_MB = 2
+
+# budget of one AI move: thinking time in seconds and number of searched nodes (None for no limit)
+AI_MOVE_TIME = 1.0
+AI_MOVE_NODES = None
+MAX_SEARCH_DEPTH = 32
+
+# number of processes sharing the root moves of a search (1 searches in this process only)
+AI_WORKERS = 1
+
+# a capture is skipped by the quiescence search if winning the captured piece plus this margin
+# would still leave the side to move below the score it already has (delta pruning)
+DELTA_MARGIN = 200
+
+# margins near the leaves, indexed by the remaining depth (1 or 2). A position whose evaluation is
+# RAZOR_MARGINS below alpha only has its captures searched (razoring) and, when it is
+# FUTILITY_MARGINS below alpha, moves that do not win enough material in their exchange to close
+# the gap are skipped (futility pruning)
+RAZOR_MARGINS = (0, 300, 600)
+FUTILITY_MARGINS = (0, 200, 500)
+
+# depth reduction of the search after a null move (passing the turn)
+NULL_MOVE_REDUCTION = 2
+
+# quiet moves after the first LATE_MOVE_COUNT moves of a node with at least LATE_MOVE_DEPTH
+# remaining are searched one ply shallower (late move reductions)
+LATE_MOVE_COUNT = 3
+LATE_MOVE_DEPTH = 3
+
+# half width of the window around the previous score that each iterative deepening search starts with
+ASPIRATION_WINDOW = 50
+
+# bound types of transposition table scores
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# score of a position the endgame tablebases show as won, minus the plies from the root of the
+# search to the mate (its ply plus its distance to mate, so quicker mates score higher). Scores
+# beyond TABLEBASE_BOUND are tablebase wins or mates, stored as plies from the stored position
+TABLEBASE_WIN = 10000
+TABLEBASE_BOUND = TABLEBASE_WIN - 1000
+
+# score of checkmating, minus the plies from the root of the search to the mate (so quicker mates
+# score higher). Scores beyond MATE_BOUND are mates: the transposition table stores them as plies
+# from the stored position instead of from the root
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+
+# pawn structure: penalty of each extra pawn on a file and of each pawn without friendly pawns on
+# the files beside it, and bonus of a passed pawn by the number of rows it has advanced
+DOUBLED_PAWN_PENALTY = 10
+ISOLATED_PAWN_PENALTY = 10
+PASSED_PAWN_BONUS = (0, 10, 15, 25, 40, 60, 90)
+
+# bitboards of each file, of the files beside it, and of the squares in front of a pawn on its own
+# and neighbouring files (no enemy pawn there means the pawn is passed)
+FILES = tuple(FILE_A << col for col in range(8))
+ADJACENT_FILES = tuple((FILES[col - 1] if col > 0 else 0) | (FILES[col + 1] if col < 7 else 0) for col in range(8))
+PASSED_PAWN_MASKS = {
+    "l": tuple((FILES[sq & 7] | ADJACENT_FILES[sq & 7]) & ((1 << (sq >> 3) * 8) - 1) for sq in range(64)),
+    "d": tuple((FILES[sq & 7] | ADJACENT_FILES[sq & 7]) & (FULL_BOARD ^ ((1 << ((sq >> 3) + 1) * 8) - 1))
+               for sq in range(64))
+}
 
-# dictionary of light pieces on the board (keys = "row,col"; values = chess piece eg "kl")
-light_pieces = {}
-# dictionary of dark pieces on the board (keys = "row,col"; values = chess piece eg "kl")
-dark_pieces = {}
 
-piece_values = {
-    "kl": 20000, "ql": 900, "rl": 500, "bl": 330, "nl": 320, "pl": 100, "  ": 0,
-    "kd": -20000, "qd": -900, "rd": -500, "bd": -330, "nd": -320, "pd": -100
-}
+class Transposition_table(Hash_table):
 
-square_values = {
-    "pl": [
-        [55, 55, 55, 55, 55, 55, 55, 55],
-        [50, 50, 50, 50, 50, 50, 50, 50],
-        [10, 10, 20, 30, 30, 20, 10, 10],
-        [5,  5, 10, 25, 25, 10,  5,  5],
-        [0,  0,  0, 20, 20,  0,  0,  0],
-        [5, -5, -10,  0,  0, -10, -5,  5],
-        [5, 10, 10, -20, -20, 10, 10,  5],
-        [0,  0,  0,  0,  0,  0,  0,  0]
-    ],
-
-    "nl": [
-        [-50, -40, -30, -30, -30, -30, -40, -50],
-        [-40, -20,  0,  0,  0,  0, -20, -40],
-        [-30,  0, 10, 15, 15, 10,  0, -30],
-        [-30,  5, 15, 20, 20, 15,  5, -30],
-        [-30,  0, 15, 20, 20, 15,  0, -30],
-        [-30,  5, 10, 15, 15, 10,  5, -30],
-        [-40, -20,  0,  5,  5,  0, -20, -40],
-        [-50, -40, -30, -30, -30, -30, -40, -50]
-    ],
-
-    "bl": [
-        [-20, -10, -10, -10, -10, -10, -10, -20],
-        [-10,  0,  0,  0,  0,  0,  0, -10],
-        [-10,  0,  5, 10, 10,  5,  0, -10],
-        [-10,  5,  5, 10, 10,  5,  5, -10],
-        [-10,  0, 10, 10, 10, 10,  0, -10],
-        [-10, 10, 10, 10, 10, 10, 10, -10],
-        [-10,  5,  0,  0,  0,  0,  5, -10],
-        [-20, -10, -10, -10, -10, -10, -10, -20]
-    ],
-
-    "rl": [
-        [0,  0,  0,  0,  0,  0,  0,  0],
-        [5, 10, 10, 10, 10, 10, 10,  5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [-5,  0,  0,  0,  0,  0,  0, -5],
-        [0,  0,  0,  5,  5,  0,  0,  0]
-    ],
-
-    "ql": [
-        [-20, -10, -10, -5, -5, -10, -10, -20],
-        [-10,  0,  0,  0,  0,  0,  0, -10],
-        [-10,  0,  5,  5,  5,  5,  0, -10],
-        [-5,  0,  5,  5,  5,  5,  0, -5],
-        [0,  0,  5,  5,  5,  5,  0, -5],
-        [-10,  5,  5,  5,  5,  5,  0, -10],
-        [-10,  0,  5,  0,  0,  0,  0, -10],
-        [-20, -10, -10, -5, -5, -10, -10, -20]
-    ],
-
-    # middle game
-    "kl": [
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-20, -30, -30, -40, -40, -30, -30, -20],
-        [-10, -20, -20, -20, -20, -20, -20, -10],
-        [20, 20,  0,  0,  0,  0, 20, 20],
-        [20, 30, 10,  0,  0, 10, 30, 20]
-    ],
-
-    # end game
-    # "kl":[
-    #     [-50,-40,-30,-20,-20,-30,-40,-50],
-    #     [-30,-20,-10,  0,  0,-10,-20,-30],
-    #     [-30,-10, 20, 30, 30, 20,-10,-30],
-    #     [-30,-10, 30, 40, 40, 30,-10,-30],
-    #     [-30,-10, 30, 40, 40, 30,-10,-30],
-    #     [-30,-10, 20, 30, 30, 20,-10,-30],
-    #     [-30,-30,  0,  0,  0,  0,-30,-30],
-    #     [-50,-30,-30,-30,-30,-30,-30,-50]
-    # ]
-
-
-    "  ": [
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0]
-    ],
-
-    # middle game
-    "kd": [
-        [-20, -30, -10, 0,  0, -10, -30, -20],
-        [-20, -20, 0,  0,  0, 0, -20, -20],
-        [10, 20, 20, 20, 20, 20, 20, 10],
-        [20, 30, 30, 40, 40, 30, 30, 20],
-        [30, 40, 40, 50, 50, 40, 40, 30],
-        [30, 40, 40, 50, 50, 40, 40, 30],
-        [30, 40, 40, 50, 50, 40, 40, 30],
-        [30, 40, 40, 50, 50, 40, 40, 30]
-    ],
-
-    "pd": [
-        [0,  0,  0,  0,  0,  0,  0,  0],
-        [-5, -10, -10, 20, 20, -10, -10, -5],
-        [-5, 5, 10,  0,  0, 10,  5,  5],
-        [0,  0,  0, -20, -20,  0,  0,  0],
-        [-5, -5, -10, -25, -25, -10, -5, -5],
-        [-10, -10, -20, -30, -30, -20, -10, -10],
-        [-50, -50, -50, -50, -50, -50, -50, -50],
-        [-55, -55, -55, -55, -55, -55, -55, -55]
-    ],
-
-    "nd": [
-        [50, 40, 30, 30, 30, 30, 40, 50],
-        [40, 20,  0, -5, -5,  0, 20, 40],
-        [30, -5, -10, -15, -15, -10, -5, 30],
-        [30,  0, -15, -20, -20, -15,  0, 30],
-        [30, -5, -15, -20, -20, -15, -5, 30],
-        [30, -0, -10, -15, -15, -10,  0, 30],
-        [40, 20,  0,  0,  0,  0, 20, 40],
-        [50, 40, 30, 30, 30, 30, 40, 50]
-    ],
-
-    "bd": [
-        [20, 10, 10, 10, 10, 10, 10, 20],
-        [10, -5,  0,  0,  0,  0, -5, 10],
-        [10, -10, -10, -10, -10, -10, -10, 10],
-        [10,  0, -10, -10, -10, -10,  0, 10],
-        [10, -5, -5, -10, -10, -5, -5, 10],
-        [10,  0, -5, -10, -10, -5,  0, 10],
-        [10,  0,  0,  0,  0,  0,  0, 10],
-        [20, 10, 10, 10, 10, 10, 10, 20]
-    ],
-
-    "rd": [
-        [0,  0,  0, -5, -5,  0,  0,  0],
-        [5,  0,  0,  0,  0,  0,  0,  5],
-        [5,  0,  0,  0,  0,  0,  0,  5],
-        [5,  0,  0,  0,  0,  0,  0,  5],
-        [5,  0,  0,  0,  0,  0,  0,  5],
-        [5,  0,  0,  0,  0,  0,  0,  5],
-        [-5, -10, -10, -10, -10, -10, -10, -5],
-        [0,  0,  0,  0,  0,  0,  0,  0]
-    ],
-
-    "qd": [
-        [20, 10, 10,  5,  5, 10, 10, 20],
-        [10,  0,  5,  0,  0,  0,  0, 10],
-        [10,  -5, -5, -5, -5, -5, 0, 10],
-        [0,  0, -5, -5,  -5, -5,  0,  5],
-        [5,  0, -5, -5, -5, -5,  0,  5],
-        [10,  0, -5, -5, -5, -5,  0, 10],
-        [10,  0,  0,  0,  0,  0,  0, 10],
-        [20, 10, 10,  5,  5, 10, 10, 20]
-    ]
+    # approximate memory held by one entry (list slot, entry tuple, zobrist key, score and move id)
+    # in bytes, measured with sys.getsizeof
+    ENTRY_SIZE = 188
 
-}
+    def __init__(self, size_mb=TRANSPOSITION_TABLE_MB):
+        """
+            fixed size table of searched positions indexed by their zobrist key. Each entry is
+            a tuple of (zobrist_key, depth, score, bound, best_move_id, age), the best move kept
+            as its Move.move_id so an entry holds no Move object. When two positions share a
+            slot the entry searched deeper is kept, unless it is left over (aged) from an
+            earlier search
+
+            input parameter(s):
+            size_mb --> memory budget of the table in megabytes. Default is TRANSPOSITION_TABLE_MB
+
+            return parameter(s):
+            None
+        """
+        super().__init__(size_mb)
+
+    def clear(self):
+        """
+            removes all entries and resets the age and the statistics
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        super().clear()
+        self.age = 0
+        self.stores = 0
+
+    def new_search(self):
+        """
+            ages the table so entries of earlier searches are replaced first
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        """
+            looks up a position
+
+            input parameter(s):
+            key --> zobrist key of the position (int)
+
+            return parameter(s):
+            entry --> (zobrist_key, depth, score, bound, best_move_id, age) tuple or None if
+                      the position is not stored
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, best_move_id):
+        """
+            stores the result of a search (depth-preferred, aged entries are always replaced)
 
+            input parameter(s):
+            key       --> zobrist key of the position (int)
+            depth     --> depth the position was searched to (int)
+            score     --> evaluation of the position (int)
+            bound     --> EXACT, LOWER_BOUND or UPPER_BOUND
+            best_move_id --> Move.move_id of the best move found (int or None)
+
+            return parameter(s):
+            None
+        """
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.age or depth >= entry[1]:
+            if entry is not None and entry[0] != key:
+                self.replacements += 1
+            self.entries[index] = (key, depth, score, bound, best_move_id, self.age)
+            self.stores += 1
+
+    def stats(self):
+        """
+            usage statistics of the table
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            stats --> dictionary of hits, misses, hit_rate, stores, replacements, used entries
+                      and size
+        """
+        stats = super().stats()
+        stats["stores"] = self.stores
+        return stats
 
-def order_moves(moves):
+
+class Pawn_hash_table(Hash_table):
+
+    # approximate memory held by one entry (list slot, entry tuple, pawn key and score) in bytes,
+    # measured with sys.getsizeof
+    ENTRY_SIZE = 128
+
+    def __init__(self, size_mb=PAWN_HASH_TABLE_MB):
+        """
+            fixed size table of pawn structure scores indexed by the pawn key of the position
+            (Game_state.pawn_key). Each entry is a tuple of (pawn_key, score) and a new entry
+            always replaces the old one. The pawns rarely change between the positions of a
+            search, so most lookups hit
+
+            input parameter(s):
+            size_mb --> memory budget of the table in megabytes. Default is PAWN_HASH_TABLE_MB
+
+            return parameter(s):
+            None
+        """
+        super().__init__(size_mb)
+
+    def probe(self, key):
+        """
+            looks up a pawn structure
+
+            input parameter(s):
+            key --> pawn key of the position (int)
+
+            return parameter(s):
+            score --> pawn structure score (positive favours light) or None if it is not stored
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def store(self, key, score):
+        """
+            stores the score of a pawn structure
+
+            input parameter(s):
+            key   --> pawn key of the position (int)
+            score --> pawn structure score (int)
+
+            return parameter(s):
+            None
+        """
+        index = key % self.size
+        if self.entries[index] is not None:
+            self.replacements += 1
+        self.entries[index] = (key, score)
+
+
+class Search_timeout(Exception):
+    """
+        raised by negamax when the time or node budget of the current search has run out
     """
-        Order moves
+
+
+transposition_table = Transposition_table()
+pawn_hash_table = Pawn_hash_table()
+# moves of known opening positions, played without searching (book.BOOK_FILE, empty if missing)
+opening_book = Opening_book()
+# exact results of endgames with a lone king (tablebase.TABLEBASE_DIR, only the tables generated)
+tablebases = Tablebase()
+
+# nodes searched so far and the limits of the current search (checked by negamax). stop is the
+# Event of the current search (set to cancel it when it runs in the background), start, time_limit and depth (last completed depth)
+# let ponder_hit put a time limit on a search that was started without one
+search_limits = {"nodes": 0, "node_limit": inf, "deadline": inf, "stop": threading.Event(),
+                 "start": 0, "time_limit": inf, "depth": 0}
+
+# thread running the searches started by start_ai_move (so the GUI event loop keeps running)
+search_thread = ThreadPoolExecutor(1)
+
+# pool of worker processes for parallel searches (created on first use) and the event that tells
+# its workers to give up their searches
+search_pool = {"executor": None, "workers": 0, "stop": None}
+
+# two quiet moves per ply that caused the latest cutoffs (killer moves)
+killer_moves = [[None, None] for ply in range(MAX_SEARCH_DEPTH + 1)]
+# cutoffs caused by each quiet move of each colour (butterfly history, indexed by move_id & FROM_TO)
+history_scores = {"l": [0] * (FROM_TO + 1), "d": [0] * (FROM_TO + 1)}
+
+
+def evaluate(game_state):
+    """
+        Evaluates chess board
 
         input parameter(s):
-        move --> List of moves to be ordered
+        game_state --> Game_state object to be evaluated
 
         return parameter(s):
-        moves_ordered --> List of moves after ordering
+        score --> The board evaluation: piece values plus square values (kept up to date by the
+                  game state as moves are made and undone), tapered from the middle game to the
+                  end game square values as the game phase drops, plus the pawn structure
     """
-    moves_ordered = []  # list to store ordered moves
+    phase = min(game_state.phase, MAX_PHASE)  # promotions can take the phase above MAX_PHASE
+    score = (game_state.score * phase + game_state.end_game_score * (MAX_PHASE - phase)) // MAX_PHASE
 
-    # capturing moves
-    for move in moves:
-        if (move.piece_captured != "  ") and (move not in moves_ordered):
-            moves_ordered.append(move)
+    pawns = pawn_hash_table.probe(game_state.pawn_key)
+    if pawns is None:
+        pawns = pawn_structure(game_state.bitboards["pl"], game_state.bitboards["pd"])
+        pawn_hash_table.store(game_state.pawn_key, pawns)
+    return score + pawns
 
-    # pawn promotion
-    for move in moves:
-        if (move.piece_moved[0] == "p") and (move.end_row == 0 or move.end_row == 7):
-            if move not in moves_ordered:
-                moves_ordered.append(move)
 
-    # Advancing moves
-    for move in moves:
-        if ((move.piece_moved[1] == "l") and (move.end_row < move.start_row)) or \
-                ((move.piece_moved[1] == "d") and (move.end_row > move.start_row)):
-            if move not in moves_ordered:
-                moves_ordered.append(move)
+def pawn_structure(light_pawns, dark_pawns):
+    """
+        scores the pawn structure: doubled and isolated pawns are penalised and passed pawns get
+        a bonus that grows as they advance
 
-    # remaining moves
-    for move in moves:
-        if move not in moves_ordered:
-            moves_ordered.append(move)
+        input parameter(s):
+        light_pawns --> bitboard of the light pawns (int)
+        dark_pawns  --> bitboard of the dark pawns (int)
 
-    return moves_ordered
+        return parameter(s):
+        score --> pawn structure score (positive favours light)
+    """
+    score = 0
+    for pawns, enemy_pawns, colour, sign in ((light_pawns, dark_pawns, "l", 1), (dark_pawns, light_pawns, "d", -1)):
+        for col in range(8):
+            count = bin(pawns & FILES[col]).count("1")
+            if count:
+                score -= sign * DOUBLED_PAWN_PENALTY * (count - 1)
+                if not pawns & ADJACENT_FILES[col]:
+                    score -= sign * ISOLATED_PAWN_PENALTY * count
+
+        while pawns:
+            sq = (pawns & -pawns).bit_length() - 1
+            pawns &= pawns - 1
+            if not enemy_pawns & PASSED_PAWN_MASKS[colour][sq]:
+                score += sign * PASSED_PAWN_BONUS[6 - (sq >> 3) if colour == "l" else (sq >> 3) - 1]
+    return score
 
 
-def evaluate(board):
+def store(key, depth, score, best_move, alpha, beta, ply):
     """
-        Evaluates chess board
+        stores a search result in the transposition table with the bound its score gives
 
         input parameter(s):
-        board --> The chess board to be evaluated
+        key --> zobrist key of the searched position
+        depth --> depth of the search
+        score --> evaluation found by the search
+        best_move --> best move found by the search
+        alpha --> alpha value the search was started with
+        beta --> beta value the search was started with
+        ply --> number of moves from the root of the search to the position
 
         return parameter(s):
-        score --> The board evaluation
+        None
     """
-    score = 0
+    if score <= alpha:  # no move reached alpha, the real score is at most score
+        bound = UPPER_BOUND
+    elif score >= beta:  # cut off, the real score is at least score
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transposition_table.store(key, depth, to_table_score(score, ply), bound,
+                              None if best_move is None else best_move.move_id)
+
+
+def to_table_score(score, ply):
+    """
+        converts a mate or tablebase win score from plies from the root to plies from the
+        position (the same position can be reached at any ply), other scores are unchanged
+
+        input parameter(s):
+        score --> evaluation for the side to move (int)
+        ply --> number of moves from the root of the search to the position
+
+        return parameter(s):
+        score --> score to store in the transposition table
+    """
+    if score >= TABLEBASE_BOUND:
+        return score + ply
+    if score <= -TABLEBASE_BOUND:
+        return score - ply
+    return score
 
-    for i in range(len(board)):
-        for j in range(len(board[i])):
-            # Add piece value and it's current square value (A Queen on d4 will be worth 900 + 5)
-            piece_value = piece_values[board[i][j]] + \
-                square_values[board[i][j]][i][j]
-            # Add piece value to overall board score
-            score += piece_value
 
+def from_table_score(score, ply):
+    """
+        converts a mate or tablebase win score read from the transposition table back to plies
+        from the root (the inverse of to_table_score)
+
+        input parameter(s):
+        score --> score stored in the transposition table (int)
+        ply --> number of moves from the root of the search to the position
+
+        return parameter(s):
+        score --> evaluation for the side to move
+    """
+    if score >= TABLEBASE_BOUND:
+        return score - ply
+    if score <= -TABLEBASE_BOUND:
+        return score + ply
     return score
 
 
-def minimax(game_state, depth, alpha=-inf, beta=inf):
+def is_quiet(move):
+    """
+        determines if a move neither captures nor promotes
+
+        input parameter(s):
+        move --> Move object
+
+        return parameter(s):
+        bool of True or False
+    """
+    return move.piece_captured == "  " and not move.en_passant_captured and not move.promotion
+
+
+def update_move_ordering(move, depth, ply):
+    """
+        remembers a quiet move that caused a cutoff as a killer move of its ply and raises its
+        history score (deeper cutoffs count more)
+
+        input parameter(s):
+        move --> move that caused the cutoff
+        depth --> remaining depth of the search where the cutoff happened
+        ply --> number of moves from the root of the search
+
+        return parameter(s):
+        None
+    """
+    if not is_quiet(move):
+        return  # captures and promotions are ordered by the move generator
+
+    killers = killer_moves[ply]
+    if killers[0] != move:
+        killers[1] = killers[0]
+        killers[0] = move
+    history_scores[move.piece_moved[1]][move.move_id & FROM_TO] += depth * depth
+
+
+def reset_move_ordering():
+    """
+        forgets the killer moves and halves the history scores before a new search (so moves
+        that cut off in earlier positions still come first, but weigh less over time)
+
+        input parameter(s):
+        None
+
+        return parameter(s):
+        None
+    """
+    for killers in killer_moves:
+        killers[0] = killers[1] = None
+    for scores in history_scores.values():
+        scores[:] = [score >> 1 for score in scores]
+
+
+def capture_gain(move):
+    """
+        material won by a capture or promotion
+
+        input parameter(s):
+        move --> capture or promotion (Move object)
+
+        return parameter(s):
+        gain --> value of the captured piece plus the value a promotion adds (int)
+    """
+    gain = abs(piece_values[move.en_passant_captured or move.piece_captured])
+    if move.promotion:
+        gain += piece_values[move.promotion + "l"] - piece_values["pl"]
+    return gain
+
+
+def check_limits():
+    """
+        counts a searched node and stops the search (raises Search_timeout) when its node budget
+        has run out, or, every 256 nodes, when it was stopped or its time has run out
+
+        input parameter(s):
+        None
+
+        return parameter(s):
+        None
+    """
+    search_limits["nodes"] += 1
+    if search_limits["nodes"] >= search_limits["node_limit"] or \
+            (search_limits["nodes"] & 255 == 0 and
+             (search_limits["stop"].is_set() or time.perf_counter() > search_limits["deadline"])):
+        raise Search_timeout
+
+
+def quiescence(game_state, alpha=-inf, beta=inf, ply=0):
+    """
+        searches only captures and promotions (all moves when in check) until the position is
+        quiet, so the evaluation at the end of negamax is not taken in the middle of an exchange.
+        The side to move may also stand pat (keep the current evaluation) instead of capturing,
+        and captures that lose material in their exchange (static exchange evaluation) are skipped
+
+        input parameter(s):
+        game_state --> Game_state object
+        alpha --> alpha value to use for alpha beta pruning. Default is -inf
+        beta --> beta value to use for alpha beta pruning. Default is inf
+        ply --> number of moves from the root of the search (scores mates). Default is 0
+
+        return parameter(s):
+        best_eval --> Evaluation of the position for the side to move
+    """
+    check_limits()  # stop when the budget of the search has run out
+
+    colour = 1 if game_state.light_to_move else -1
+    if game_state.is_in_check():  # no standing pat in check, every evasion is searched
+        stand_pat = None
+        best_eval = -inf
+        moves = game_state.generate_moves()
+    else:
+        stand_pat = best_eval = colour * evaluate(game_state)
+        if best_eval >= beta:
+            return best_eval
+        alpha = max(alpha, best_eval)
+        moves = game_state.generate_moves(captures_only=True)
+
+    for move in moves:
+        # delta pruning
+        if stand_pat is not None and stand_pat + capture_gain(move) + DELTA_MARGIN <= alpha:
+            continue
+        # losing captures
+        if stand_pat is not None and game_state.see(move) < 0:
+            continue
+
+        game_state.make_move(move, True)  # make move in look_ahead mode
+        current_eval = -quiescence(game_state, -beta, -alpha, ply + 1)
+        game_state.undo_move(True)
+
+        best_eval = max(best_eval, current_eval)
+        alpha = max(alpha, current_eval)
+        if beta <= alpha:
+            break
+
+    if best_eval == -inf:  # no valid moves in check: checkmate
+        return -MATE_SCORE + ply
+    return best_eval
+
+
+def negamax(game_state, depth, alpha=-inf, beta=inf, first_move=None, ply=0, null_move=True):
     """
-        Determine best move to play
+        Determine best move to play with a principal variation search: the first move is
+        searched with the full alpha beta window and the others with a null window, which only
+        proves that they are not better. A move that turns out better is searched again with
+        the full window. Scores are from the point of view of the side to move (the score of a
+        position is minus the score of the position after the best reply).
+        Two selective rules cut the tree: if passing the turn (a null move) still scores beta
+        or more in a shallower search, the position is cut off without searching its moves, and
+        late quiet moves are searched one ply shallower first (late move reductions), and only
+        searched at full depth if the shallow search finds them better than alpha. One or two
+        plies from the leaves, positions far below alpha are razored (only captures searched)
+        and moves that cannot close the gap are skipped (futility pruning). Endgames found in
+        the tablebases are scored from their result and distance to mate without a search
 
         input parameter(s):
         game_state --> Game_state object
         depth --> The number of moves ahead to check before deciding best move
         alpha --> alpha value to use for alpha beta pruning. Default is -inf
         beta --> beta value to use for alpha beta pruning. Default is inf
+        first_move --> move to search first (eg the best move of a shallower search). Default is
+                       the move stored in the transposition table
+        ply --> number of moves from the root of the search. Default is 0
+        null_move --> allow a null move in this position (not after another null move). Default is True
 
         return parameter(s):
         best_move --> The best move to play
-        max_eval --> Evaluation of best_move
+        best_eval --> Evaluation of best_move for the side to move
     """
+    check_limits()  # stop when the budget of the search has run out
+
+    colour = 1 if game_state.light_to_move else -1
+
     # Breaking condition
-    if (depth == 0) or (game_state.check_mate) or (game_state.stale_mate):
-        return None, evaluate(game_state.board)
-
-    # Get valid moves
-    moves = game_state.get_valid_moves()[0]
-    moves_ordered = []  # List to store moves after ordering
-
-    if moves:  # If there are valid moves
-        moves_ordered = order_moves(moves)
-        # Select a random move as best_move
-        best_move = random.choice(moves_ordered)
-    else:  # If there are no valid moves
-        return None, evaluate(game_state.board)
-
-    if game_state.light_to_move:  # If it is light's turn to play
-        max_eval = -inf
-        for move in moves_ordered:
-            game_state.make_move(move, True)  # make move in look_ahead mode
-            # Call minimax on all possible moves after above move
-            current_eval = minimax(game_state, depth-1, alpha, beta)[1]
+    if game_state.check_mate:
+        return None, -MATE_SCORE + ply
+    if game_state.stale_mate:
+        return None, 0
+
+    # endgames in the tablebases are scored exactly, their moves are not searched
+    if ply > 0:
+        result = tablebases.probe(game_state)
+        if result is not None:
+            return None, result[0] * (TABLEBASE_WIN - ply - result[1])
+
+    if depth == 0:  # search captures until the position is quiet
+        return None, quiescence(game_state, alpha, beta, ply)
+
+    # positions already searched deep enough (eg reached by another move order) are not searched again
+    key = game_state.zobrist_key
+    entry = transposition_table.probe(key)
+    hash_move_id = None if first_move is None else first_move.move_id
+    if entry is not None:
+        if hash_move_id is None:
+            hash_move_id = entry[4]
+        if entry[1] >= depth and ply > 0:  # the root is always searched, so it returns a move to play
+            score = from_table_score(entry[2], ply)
+            if entry[3] == EXACT:
+                return None, score
+            elif entry[3] == LOWER_BOUND:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if beta <= alpha:
+                return None, score
+
+    in_check = game_state.is_in_check()
+
+    # null move pruning: when passing the turn is already too good for the opponent to allow, so
+    # is (almost always) the best move. Not in check, at the root or with only pawns left
+    # (where passing could really be the best option: zugzwang)
+    if null_move and ply > 0 and beta < inf and depth > NULL_MOVE_REDUCTION and not in_check and \
+            game_state.has_pieces("l" if game_state.light_to_move else "d"):
+        game_state.make_null_move()
+        current_eval = -negamax(game_state, depth-1-NULL_MOVE_REDUCTION, -beta, -beta+1, ply=ply+1, null_move=False)[1]
+        game_state.undo_null_move()
+        if current_eval >= beta:  # a mate found after passing is not a real mate
+            return None, beta if current_eval >= MATE_BOUND else current_eval
+
+    # razoring and futility pruning near the leaves (not at the root or in check)
+    futility = None
+    if ply > 0 and depth < len(FUTILITY_MARGINS) and not in_check:
+        static_eval = colour * evaluate(game_state)
+        if static_eval + RAZOR_MARGINS[depth] <= alpha:  # only captures could help
+            current_eval = quiescence(game_state, alpha, alpha + 1, ply)
+            if current_eval <= alpha:
+                return None, current_eval
+        if static_eval + FUTILITY_MARGINS[depth] <= alpha:
+            futility = static_eval + FUTILITY_MARGINS[depth]
+
+    alpha_start = alpha
+    best_move, best_eval = None, -inf
+    move_count = 0
+
+    # valid moves are generated lazily in stages (the best move stored for this position, captures,
+    # promotions then quiet moves), so the later stages are never generated when an early move
+    # causes a cutoff
+    moves = game_state.generate_moves(hash_move_id, killer_moves[ply],
+                                      history_scores["l" if game_state.light_to_move else "d"])
+    for move in moves:
+        move_count += 1
+        if futility is not None and best_move is not None:
+            # best the move can do: the evaluation plus the margin plus what it wins in its exchange
+            estimate = futility + (0 if is_quiet(move) else max(0, game_state.see(move)))
+        else:
+            estimate = inf
+
+        game_state.make_move(move, True)  # make move in look_ahead mode
+        if estimate <= alpha and not game_state.is_in_check():  # futility pruning (checks are kept)
             game_state.undo_move(True)
+            best_eval = max(best_eval, estimate)
+            continue
 
-            # Update best_move and current_eval
-            if current_eval > max_eval:
-                max_eval = current_eval
-                best_move = move
+        if best_move is None:  # principal variation (full window)
+            current_eval = -negamax(game_state, depth-1, -beta, -alpha, ply=ply+1)[1]
+        else:
+            # late quiet moves (not in check or giving check) are searched one ply shallower
+            reduction = 1 if move_count > LATE_MOVE_COUNT and depth >= LATE_MOVE_DEPTH and not in_check and \
+                is_quiet(move) and not game_state.is_in_check() else 0
 
-            # alpha beta pruning
-            alpha = max(alpha, current_eval)
-            if beta <= alpha:
-                break
+            # null window: only proves the move is not better than alpha
+            current_eval = -negamax(game_state, depth-1-reduction, -alpha-1, -alpha, ply=ply+1)[1]
+            if reduction and current_eval > alpha:  # verify at full depth
+                current_eval = -negamax(game_state, depth-1, -alpha-1, -alpha, ply=ply+1)[1]
+            if alpha < current_eval < beta:  # better after all, search again with the full window
+                current_eval = -negamax(game_state, depth-1, -beta, -alpha, ply=ply+1)[1]
+        game_state.undo_move(True)
+
+        # Update best_move and best_eval
+        if current_eval > best_eval:
+            best_eval = current_eval
+            best_move = move
+
+        # alpha beta pruning
+        alpha = max(alpha, current_eval)
+        if beta <= alpha:
+            update_move_ordering(move, depth, ply)
+            break
+
+    if best_move is None:  # no valid moves: checkmate or stalemate
+        return None, -MATE_SCORE + ply if in_check else 0
+
+    store(key, depth, best_eval, best_move, alpha_start, beta, ply)
+    return best_move, best_eval
+
+
+def time_for_next_depth(start, time_limit):
+    """
+        determines if iterative deepening should start another depth: a search takes several
+        times longer than the one before it, so one started after half of the time would most
+        likely be thrown away
+
+        input parameter(s):
+        start --> time.perf_counter() when the search started
+        time_limit --> thinking time in seconds
+
+        return parameter(s):
+        bool of True or False
+    """
+    return time.perf_counter() - start <= time_limit / 2
 
-        return best_move, max_eval
 
-    else:  # If it is light's turn to play
-        min_eval = inf
-        for move in moves_ordered:
-            game_state.make_move(move, True)  # make move in look_ahead mode
-            # Call minimax on all possible moves after above move
-            current_eval = minimax(game_state, depth-1, alpha, beta)[1]
+def iterative_deepening(game_state, time_limit=None, node_limit=None, max_depth=MAX_SEARCH_DEPTH, stop=None):
+    """
+        searches one ply deeper at a time until the time or node budget runs out. The best move
+        of each completed depth is searched first at the next depth, and the result of the last
+        completed depth is returned (depth 1 is always completed). Each depth starts with an
+        aspiration window (ASPIRATION_WINDOW around the previous score) and only opens the side
+        of the window the score falls outside of
+
+        input parameter(s):
+        game_state --> Game_state object
+        time_limit --> thinking time in seconds or None for AI_MOVE_TIME. Default is None
+        node_limit --> maximum number of searched nodes (inf for no limit) or None for
+                       AI_MOVE_NODES. Default is None
+        max_depth --> deepest search. Default is MAX_SEARCH_DEPTH
+        stop --> threading.Event that stops the search when set, or None for a new one. Default
+                 is None
+
+        return parameter(s):
+        best_move --> The best move to play (None if there are no valid moves or the search was
+                      stopped before depth 1 completed)
+        best_eval --> Evaluation of best_move (positive favours light)
+        depth --> depth of the last completed search
+    """
+    # read when the search starts, so AI_MOVE_TIME and AI_MOVE_NODES can be changed at any time
+    time_limit = AI_MOVE_TIME if time_limit is None else time_limit
+    node_limit = AI_MOVE_NODES if node_limit is None else node_limit
+    moves_made = len(game_state.move_log)
+    best_move, best_eval, completed = None, None, 0
+
+    search_limits["nodes"] = search_limits["depth"] = 0
+    search_limits["node_limit"] = search_limits["deadline"] = inf
+    # each search has its own event, so a cancel that comes before the search starts is not lost
+    search_limits["stop"] = threading.Event() if stop is None else stop
+    search_limits["start"] = time.perf_counter()
+    search_limits["time_limit"] = time_limit
+    reset_move_ordering()
+
+    for depth in range(1, max_depth + 1):
+        if best_move is None:
+            alpha, beta = -inf, inf
+        else:
+            alpha, beta = best_eval - ASPIRATION_WINDOW, best_eval + ASPIRATION_WINDOW
+
+        try:
+            while True:
+                move, current_eval = negamax(game_state, depth, alpha, beta, first_move=best_move)
+                if move is None or alpha < current_eval < beta:
+                    break
+                # outside of the window (the score is only a bound), open the failing side
+                if current_eval <= alpha:
+                    alpha = -inf
+                else:
+                    beta = inf
+        except Search_timeout:
+            # take back the moves (and null moves) of the unfinished search
+            while len(game_state.move_log) > moves_made:
+                if game_state.move_log[-1] is None:
+                    game_state.undo_null_move()
+                else:
+                    game_state.undo_move(True)
+            break
+
+        if move is None:  # If there are no valid moves
+            break
+        best_move, best_eval, completed = move, current_eval, depth
+        search_limits["depth"] = depth
+
+        # the time limit is read back as ponder_hit may have set it during the search
+        search_limits["deadline"] = search_limits["start"] + search_limits["time_limit"]
+        search_limits["node_limit"] = inf if node_limit is None else node_limit
+        if not time_for_next_depth(search_limits["start"], search_limits["time_limit"]):
+            break
+
+    if best_eval is not None and not game_state.light_to_move:
+        best_eval = -best_eval
+    return best_move, best_eval, completed
+
+
+def init_search_worker(stop):
+    """
+        sets up a worker process of the search pool: its searches stop when the pool's stop
+        event is set
+
+        input parameter(s):
+        stop --> multiprocessing Event shared by the workers of the pool
+
+        return parameter(s):
+        None
+    """
+    search_limits["stop"] = stop
+
+
+def search_root_moves(fen, notations, depth, time_left, node_limit, age):
+    """
+        searches some of the root moves of a position to a fixed depth (the work of one worker
+        process in parallel_search). The worker keeps its own transposition table and history
+        between calls, its table is aged with the table of the main process
+
+        input parameter(s):
+        fen --> position to search (FEN string from Game_state.get_fen)
+        notations --> root moves to search in coordinate notation eg "e2e4" (list of str)
+        depth --> depth of the search
+        time_left --> seconds left before the search has to stop
+        node_limit --> maximum number of nodes this worker may search
+        age --> age of the transposition table of the main process (Transposition_table.age)
+
+        return parameter(s):
+        best --> (coordinate notation of the best move, its evaluation for the side to move,
+                 nodes searched) or None if the time or nodes ran out or the pool was stopped
+    """
+    game_state = Game_state()
+    game_state.load_fen(fen)
+    moves = {move.get_coordinate_notation(): move for move in game_state.generate_moves()}
+
+    transposition_table.age = age
+    search_limits["nodes"] = 0
+    search_limits["node_limit"] = node_limit
+    search_limits["deadline"] = time.perf_counter() + time_left
+
+    best_notation, best_eval = None, -inf
+    try:
+        for notation in notations:
+            game_state.make_move(moves[notation], True)  # make move in look_ahead mode
+            if best_notation is None:
+                current_eval = -negamax(game_state, depth-1, ply=1)[1]
+            else:  # null window first, as in negamax
+                current_eval = -negamax(game_state, depth-1, -best_eval-1, -best_eval, ply=1)[1]
+                if current_eval > best_eval:
+                    current_eval = -negamax(game_state, depth-1, -inf, -best_eval, ply=1)[1]
             game_state.undo_move(True)
 
-            # Update best_move and current_eval
-            if current_eval < min_eval:
-                min_eval = current_eval
-                best_move = move
+            if current_eval > best_eval:
+                best_notation, best_eval = notation, current_eval
+    except Search_timeout:
+        return None
 
-            # alpha beta pruning
-            beta = min(beta, current_eval)
-            if beta <= alpha:
-                break
+    return best_notation, best_eval, search_limits["nodes"]
+
+
+def get_search_pool(workers):
+    """
+        gives the pool of worker processes, (re)creating it when the number of workers changed.
+        The pool is usually created from the background search thread of the GUI, and forking a
+        process with threads can leave locks held in the child, so workers are started from a
+        fork server where possible (spawned otherwise) and import this module afresh
+
+        input parameter(s):
+        workers --> number of worker processes
+
+        return parameter(s):
+        executor --> ProcessPoolExecutor
+    """
+    if search_pool["executor"] is None or search_pool["workers"] != workers:
+        close_search_pool()
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        search_pool["stop"] = context.Event()
+        search_pool["executor"] = ProcessPoolExecutor(workers, mp_context=context, initializer=init_search_worker,
+                                                      initargs=(search_pool["stop"],))
+        search_pool["workers"] = workers
+    return search_pool["executor"]
+
+
+def close_search_pool():
+    """
+        shuts the worker processes of parallel searches down (stopping the searches they are
+        running first)
+
+        input parameter(s):
+        None
+
+        return parameter(s):
+        None
+    """
+    if search_pool["executor"] is not None:
+        search_pool["stop"].set()
+        search_pool["executor"].shutdown()
+        search_pool["executor"] = None
+        search_pool["workers"] = 0
+        search_pool["stop"] = None
+
+
+def parallel_search(game_state, workers=None, time_limit=None, node_limit=None, max_depth=MAX_SEARCH_DEPTH,
+                    stop=None):
+    """
+        iterative deepening with the root moves split over worker processes (root splitting).
+        Every depth, each worker searches its share of the root moves of the position (sent as
+        a FEN string) and the best of their results is kept. The best move is dealt first so the
+        others are compared against it, and a depth unfinished when the time or nodes run out
+        is thrown away. When the search is stopped the workers are told to give up theirs. With
+        one worker this is iterative_deepening
+
+        input parameter(s):
+        game_state --> Game_state object
+        workers --> number of worker processes or None for AI_WORKERS. Default is None
+        time_limit --> thinking time in seconds or None for AI_MOVE_TIME. Default is None
+        node_limit --> maximum number of searched nodes of all workers together (inf for no
+                       limit) or None for AI_MOVE_NODES. Default is None
+        max_depth --> deepest search. Default is MAX_SEARCH_DEPTH
+        stop --> threading.Event that stops the search when set, or None for a new one. Default
+                 is None
+
+        return parameter(s):
+        best_move --> The best move to play (None if there are no valid moves or the search was
+                      stopped before depth 1 completed)
+        best_eval --> Evaluation of best_move (positive favours light)
+        depth --> depth of the last completed search
+    """
+    # read when the search starts, so the module settings can be changed at any time
+    workers = AI_WORKERS if workers is None else workers
+    time_limit = AI_MOVE_TIME if time_limit is None else time_limit
+    node_limit = AI_MOVE_NODES if node_limit is None else node_limit
+    if workers <= 1:
+        return iterative_deepening(game_state, time_limit, node_limit, max_depth, stop)
+
+    start = time.perf_counter()
+    moves = {move.get_coordinate_notation(): move for move in game_state.generate_moves()}
+    if len(moves) <= 1:  # nothing to think about
+        return next(iter(moves.values()), None), None, 0
+
+    pool = get_search_pool(workers)
+    pool_stop = search_pool["stop"]
+    pool_stop.clear()
+    fen = game_state.get_fen()
+    stop = search_limits["stop"] = threading.Event() if stop is None else stop
+    node_limit = inf if node_limit is None else node_limit
+    search_limits["nodes"] = 0
+    order = list(moves)
+    tasks = min(workers, len(order))
+    best_notation, best_eval, completed = None, None, 0
+
+    for depth in range(1, max_depth + 1):
+        # the first depth always completes (unless the search is stopped)
+        if best_notation is None:
+            time_left, worker_nodes = inf, inf
+        else:
+            time_left = time_limit - (time.perf_counter() - start)
+            worker_nodes = (node_limit - search_limits["nodes"]) // tasks
+        futures = [pool.submit(search_root_moves, fen, order[worker::workers], depth, time_left, worker_nodes,
+                               transposition_table.age) for worker in range(tasks)]
+        # wait in short steps so a stopped search returns at once
+        not_done = futures
+        while not_done and not stop.is_set():
+            not_done = wait(not_done, timeout=0.05)[1]
+        if not_done:  # stopped: the workers give up their searches before the pool is used again
+            pool_stop.set()
+            for future in not_done:
+                future.cancel()
+            wait(not_done)
+            break
+
+        results = [future.result() for future in futures]
+        if None in results:  # the time or nodes ran out
+            break
+
+        search_limits["nodes"] += sum(result[2] for result in results)
+        best_notation, best_eval = max(results, key=lambda result: result[1])[:2]
+        completed = depth
+        order.remove(best_notation)
+        order.insert(0, best_notation)
+
+        if not time_for_next_depth(start, time_limit) or search_limits["nodes"] >= node_limit:
+            break
+
+    if best_notation is None:  # stopped before depth 1 completed
+        return None, None, 0
+    return moves[best_notation], best_eval if game_state.light_to_move else -best_eval, completed
+
+
+def play_ai_move(gs, move):
+    """
+        makes the move found by the search, or flags checkmate or stalemate if there was none
+        because there are no valid moves (a search stopped before it found a move makes none)
+
+        input parameter(s):
+        gs --> Game_state object
+        move --> move found by the search on gs or on a copy of it (Move object or None)
+
+        return parameter(s):
+        ai_move --> move made on gs (None if no move was made)
+        gs      --> Game_state object
+    """
+    ai_move = None
+
+    if move:
+        # create move copy (only copy (start_row, start_col), (end_row, end_col) & promotion of move object)
+        ai_move = Move((move.start_row, move.start_col),
+                       (move.end_row, move.end_col), gs.board, move.promotion)
+
+        gs.make_move(ai_move)  # make move (promotion piece as chosen by the search)
+    else:
+        gs.get_valid_moves()  # flags checkmate or stalemate when there are no valid moves
 
-        return best_move, min_eval
+    return ai_move, gs
 
 
 def ai_light_move(gs):
@@ -322,39 +995,9 @@ def ai_light_move(gs):
     """
 
     ### TODO: edit to your unique algorithm (mini-max w/ pruning, etc) ###
-    ###		  Static evaluation of the board can be done with 'light_pieces' and 'dark_pieces' dictionaries ###
-
-    light_move = None
-    move = minimax(gs, 3)[0]  # Move as decided by minimax
 
-    if move:
-        # create move copy (only copy (start_row, start_col) & (end_row, end_col) of move object)
-        light_move = Move((move.start_row, move.start_col),
-                          (move.end_row, move.end_col), gs.board)
-
-        gs.make_move(light_move)  # make move
-
-        # handles pawn promotion
-        if (light_move.end_row == 0) and (light_move.piece_moved[0] == "p"):
-            gs.board[light_move.end_row][light_move.end_col] = random.choice(
-                ("ql", "rl", "bl", "nl"))  # randomly select promotion piece
-
-        # update light pieces position dictionary
-        # light_pieces.pop("{},{}".format(light_move.start_row, light_move.start_col))
-        # light_pieces["{},{}".format(light_move.end_row, light_move.end_col)] = light_move.piece_moved
-
-        # # remove pieces captured from dark_piece dictionary for faster static board evaluation in your mini-max algorithm rewrite
-        # if light_move.piece_captured != "  " and not light_move.en_passant_captured:
-        #     dark_pieces.pop("{},{}".format(light_move.end_row, light_move.end_col))
-        # elif light_move.en_passant_captured:
-        #     dark_pieces.pop("{},{}".format(light_move.end_row+1, light_move.end_col if gs.light_to_move else light_move.end_row-1, light_move.end_col))
-    else:
-        if gs.is_in_check():
-            gs.check_mate = True
-        else:
-            gs.stale_mate = True
-
-    return light_move, gs
+    move = parallel_search(gs)[0]  # Move as decided by the search within the time budget
+    return play_ai_move(gs, move)
 
 
 def ai_dark_move(gs):
@@ -370,44 +1013,13 @@ def ai_dark_move(gs):
     """
 
     ### TODO: edit to your unique algorithm (mini-max w/ pruning, etc) ###
-    ###		  Static evaluation of the board can be done with 'light_pieces' and 'dark_pieces' dictionaries ###
-    dark_move = None
-    move = minimax(gs, 2)[0]  # Move as decided by minimax
-
-    if move:
-        # create move copy (only copy (start_row, start_col) & (end_row, end_col) of move object)
-        dark_move = Move((move.start_row, move.start_col),
-                         (move.end_row, move.end_col), gs.board)
-
-        gs.make_move(dark_move)  # make move
-
-        # handles pawn promotion
-        if (dark_move.end_row == 7) and (dark_move.piece_moved[0] == "p"):
-            gs.board[dark_move.end_row][dark_move.end_col] = random.choice(
-                ("qd", "rd", "bd", "nd"))  # randomly select promotion piece
-
-        # update dark pieces position dictionary
-        # dark_pieces.pop("{},{}".format(dark_move.start_row, dark_move.start_col))
-        # dark_pieces["{},{}".format(dark_move.end_row, dark_move.end_col)] = dark_move.piece_moved
-
-        # # remove pieces captured from light_piece dictionary for faster static board evaluation in your mini-max algorithm rewrite
-        # if dark_move.piece_captured != "  " and not dark_move.en_passant_captured:
-        # 	light_pieces.pop("{},{}".format(dark_move.end_row, dark_move.end_col))
-        # elif dark_move.en_passant_captured:
-        # 	light_pieces.pop("{},{}".format(dark_move.end_row+1, dark_move.end_col if gs.light_to_move else dark_move.end_row-1, dark_move.end_col))
-    else:
-        if gs.is_in_check():
-            gs.check_mate = True
-        else:
-            gs.stale_mate = True
-
-    return dark_move, gs
+    move = parallel_search(gs)[0]  # Move as decided by the search within the time budget
+    return play_ai_move(gs, move)
 
 
 def ai_move(gs):
     """
             determines the turn for both team's AI
-            also saves a running memory of the board state with moves and captures
 
             input parameter(s):
             gs --> Game_state object
@@ -417,31 +1029,124 @@ def ai_move(gs):
             gs   --> Game_state object
 
     """
+    move = opening_book.get_move(gs)
+    if move is not None:  # known opening position, no search needed
+        return play_ai_move(gs, move)
 
-    if not light_pieces:
-        for i in range(len(gs.board)):
-            for j in range(len(gs.board[i])):
-                if gs.board[i][j][1] == "l":
-                    light_pieces["{},{}".format(i, j)] = gs.board[i][j]
+    transposition_table.new_search()
+    return ai_light_move(gs) if gs.light_to_move else ai_dark_move(gs)
 
-    if not dark_pieces:
-        for i in range(len(gs.board)):
-            for j in range(len(gs.board[i])):
-                if gs.board[i][j][1] == "d":
-                    dark_pieces["{},{}".format(i, j)] = gs.board[i][j]
 
-    return ai_light_move(gs) if gs.light_to_move else ai_dark_move(gs)
+def start_ai_move(gs):
+    """
+        starts searching the AI move of the side to move in a background thread, so the caller
+        (the GUI event loop) is not blocked. The search runs on a copy of the position, gs is
+        not changed: poll the returned future and make its move with play_ai_move, or stop it
+        with cancel_ai_move. The future of a position in the opening book is already done (with
+        no evaluation and depth 0)
 
+        input parameter(s):
+        gs --> Game_state object
 
-def ai_reset():
+        return parameter(s):
+        search --> Future of the search result (best_move, best_eval, depth)
     """
-            resets the light pieces and dark pieces dictionaries when AI mode is activated/deactivated (in case moves were made outside AI mode)
+    move = opening_book.get_move(gs)
+    if move is not None:
+        search = Future()
+        search.set_result((move, None, 0))
+        search.stop = threading.Event()
+        return search
 
-            input parameter(s):
-            None
+    game_state = Game_state()
+    game_state.load_fen(gs.get_fen())
 
-            output parameter(s):
-            None
+    transposition_table.new_search()
+    return submit_search(parallel_search, game_state)
+
+
+def submit_search(search, game_state, *limits):
+    """
+        runs a search in the background thread with a stop event of its own, kept on the
+        returned future (future.stop) for cancel_ai_move
+
+        input parameter(s):
+        search --> search function taking a stop keyword argument (eg parallel_search)
+        game_state --> Game_state object to search (not used by the caller any more)
+        limits --> further arguments of the search function
+
+        return parameter(s):
+        future --> Future of the search result
+    """
+    stop = threading.Event()
+    future = search_thread.submit(search, game_state, *limits, stop=stop)
+    future.stop = stop
+    return future
+
+
+def cancel_ai_move(search):
+    """
+        stops a search started by start_ai_move or start_ponder (its result is thrown away),
+        including the work of the worker processes of a parallel search, so the next search
+        does not wait behind it
+
+        input parameter(s):
+        search --> Future returned by start_ai_move or start_ponder
+
+        return parameter(s):
+        None
+    """
+    search.stop.set()  # also stops a search that has started but not checked its event yet
+    if not search.cancel() and search_pool["stop"] is not None:  # already running
+        search_pool["stop"].set()
+
+
+def start_ponder(gs):
+    """
+        starts searching, in the background thread, the position after the reply the AI expects
+        to the move it just made (the best move stored in the transposition table), so it thinks
+        while the human does. The search has no time limit until ponder_hit is called; if the
+        human plays another move, cancel it with cancel_ai_move (the transposition table and
+        history scores it filled are kept for the next search). Pondering always searches in
+        the background thread, without the worker processes of parallel_search
+
+        input parameter(s):
+        gs --> Game_state object (human to move)
+
+        return parameter(s):
+        ponder_move --> expected human move (None if there is none, nothing is searched then)
+        search      --> Future of the search result (best_move, best_eval, depth) or None
+    """
+    entry = transposition_table.probe(gs.zobrist_key)
+    if entry is None or entry[4] is None:
+        return None, None
+
+    for ponder_move in gs.get_valid_moves()[0]:
+        if ponder_move.move_id == entry[4]:
+            game_state = Game_state()
+            game_state.load_fen(gs.get_fen())
+            game_state.make_move(Move((ponder_move.start_row, ponder_move.start_col),
+                                      (ponder_move.end_row, ponder_move.end_col),
+                                      game_state.board, ponder_move.promotion))
+
+            transposition_table.new_search()
+            return ponder_move, submit_search(iterative_deepening, game_state, inf)
+    return None, None
+
+
+def ponder_hit(time_limit=None):
+    """
+        the human played the expected move: the running ponder search becomes the search of
+        the AI move. Its time limit counts from when pondering started, so the time the human
+        spent thinking is time the AI does not have to wait for
+
+        input parameter(s):
+        time_limit --> thinking time in seconds or None for AI_MOVE_TIME. Default is None
+
+        return parameter(s):
+        None
     """
-    light_pieces.clear()
-    dark_pieces.clear()
+    time_limit = AI_MOVE_TIME if time_limit is None else time_limit
+    search_limits["time_limit"] = time_limit
+    if search_limits["depth"]:  # depth 1 is always completed
+        search_limits["deadline"] = search_limits["start"] + time_limit
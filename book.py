@@ -0,0 +1,306 @@
+# This is the opening book of the AI. The book is a binary file of (zobrist key, move,
+# weight) entries sorted by key: the moves of a position are found by a binary search of
+# the memory mapped file, so a book move is picked without searching or reading the file
+#
+# usage:
+#   python book.py games.pgn                      build book.bin from the games of a PGN file
+#   python book.py a.pgn b.pgn -o my.bin -p 16    only the first 16 plies of each game
+
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+from engine import Game_state, Move, MOVE_FLAGS, PROMOTION_FLAG
+
+# default book file (read by ai.py) and number of plies of each game added to the book
+BOOK_FILE = "book.bin"
+BOOK_PLIES = 20
+
+# entry layout: zobrist key (8 bytes), Move.move_id (2 bytes) and weight (2 bytes), big endian
+BOOK_ENTRY = struct.Struct(">QHH")
+MAX_WEIGHT = 0xFFFF
+
+# weight added to a move by the result of its game for the side that played it
+RESULT_WEIGHTS = {"1-0": {"l": 2, "d": 0}, "0-1": {"l": 0, "d": 2}, "1/2-1/2": {"l": 1, "d": 1}}
+UNKNOWN_RESULT_WEIGHT = {"l": 1, "d": 1}
+
+# promotion piece of each Move.move_id promotion code (bits 12 - 13)
+PROMOTION_PIECES = ("n", "b", "r", "q")
+
+# PGN tag pair, comments, numeric annotations, move numbers and game results
+PGN_TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+PGN_NOISE = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.+|1-0|0-1|1/2-1/2|\*")
+
+
+class Opening_book():
+
+    def __init__(self, path=BOOK_FILE):
+        """
+            opening book read from a binary book file (see build_book). The file is memory
+            mapped the first time it is probed, a missing or empty file is an empty book
+
+            input parameter(s):
+            path --> book file. Default is BOOK_FILE
+
+            return parameter(s):
+            None
+        """
+        self.path = path
+        self.book = None  # mmap of the file (None until opened)
+        self.size = 0  # number of entries
+        self.opened = False
+
+    def open(self):
+        """
+            memory maps the book file
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        self.opened = True
+        if os.path.isfile(self.path) and os.path.getsize(self.path) >= BOOK_ENTRY.size:
+            with open(self.path, "rb") as book_file:
+                self.book = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self.book) // BOOK_ENTRY.size
+
+    def close(self):
+        """
+            unmaps the book file (it is mapped again by the next probe)
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        if self.book is not None:
+            self.book.close()
+        self.book = None
+        self.size = 0
+        self.opened = False
+
+    def probe(self, key):
+        """
+            looks up the book moves of a position by binary search
+
+            input parameter(s):
+            key --> zobrist key of the position (int)
+
+            return parameter(s):
+            entries --> list of (move_id, weight) tuples (empty if the position is not in the book)
+        """
+        if not self.opened:
+            self.open()
+
+        low, high = 0, self.size
+        while low < high:  # first entry with a key >= key
+            middle = (low + high) // 2
+            if BOOK_ENTRY.unpack_from(self.book, middle * BOOK_ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.size:
+            entry_key, move_id, weight = BOOK_ENTRY.unpack_from(self.book, low * BOOK_ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move_id, weight))
+            low += 1
+        return entries
+
+    def get_move(self, gs):
+        """
+            picks a book move for the position, at random in proportion to the move weights
+
+            input parameter(s):
+            gs --> Game_state object
+
+            return parameter(s):
+            move --> book move (Move object) or None if the position is not in the book
+        """
+        entries = self.probe(gs.zobrist_key)
+        if not entries:
+            return None
+
+        move_id = random.choices([entry[0] for entry in entries], [entry[1] for entry in entries])[0]
+        move = decode_move(move_id, gs.board)
+        # the key identifies the position, this only guards against a book of another engine version
+        if move.piece_moved[1] != ("l" if gs.light_to_move else "d"):
+            return None
+        return move
+
+
+def decode_move(move_id, board):
+    """
+        creates the move of a 16 bit move encoding (the inverse of Move.move_id)
+
+        input parameter(s):
+        move_id --> 16 bit encoding of the move (int)
+        board   --> board the move is played on (Game_state.board)
+
+        return parameter(s):
+        move --> Move object
+    """
+    start, end = move_id & 63, move_id >> 6 & 63
+    promotion = PROMOTION_PIECES[move_id >> 12 & 3] if move_id & MOVE_FLAGS == PROMOTION_FLAG else None
+    return Move((start >> 3, start & 7), (end >> 3, end & 7), board, promotion)
+
+
+def parse_san(gs, san):
+    """
+        finds the valid move of a move in standard algebraic notation (eg "Nf3", "exd5",
+        "O-O", "e8=Q+")
+
+        input parameter(s):
+        gs  --> Game_state object
+        san --> move in standard algebraic notation (str)
+
+        return parameter(s):
+        move --> Move object (raises ValueError if the move is not valid or is ambiguous)
+    """
+    text = san.rstrip("+#!?")
+    moves = gs.get_valid_moves()[0]
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        matches = [move for move in moves if move.castling_rook and move.end_col == end_col]
+    else:
+        promotion = None
+        if "=" in text:
+            text, promotion = text.split("=")
+            promotion = promotion.lower()
+        elif text[-1] in "QRBN" and text[0] in Move.files_to_cols:  # promotion without "=" (eg "e8Q")
+            text, promotion = text[:-1], text[-1].lower()
+
+        piece = text[0].lower() if text[0] in "KQRBN" else "p"
+        hints = text[piece != "p":-2].replace("x", "")  # file and / or rank of the start square
+        if len(text) < 2 or text[-2] not in Move.files_to_cols or text[-1] not in Move.ranks_to_rows:
+            raise ValueError("not a move: " + san)
+        end_row, end_col = Move.ranks_to_rows[text[-1]], Move.files_to_cols[text[-2]]
+
+        matches = [move for move in moves if move.piece_moved[0] == piece and move.end_row == end_row and
+                   move.end_col == end_col and move.promotion == promotion and
+                   all(hint in move.get_rank_file(move.start_row, move.start_col) for hint in hints)]
+
+    if len(matches) != 1:
+        raise ValueError(("ambiguous" if matches else "invalid") + " move: " + san)
+    return matches[0]
+
+
+def read_pgn(path):
+    """
+        reads the games of a PGN file (comments, variations and annotations are skipped)
+
+        input parameter(s):
+        path --> PGN file
+
+        return parameter(s):
+        games --> generator of (tags, moves) per game: dictionary of the tag pairs and list of
+                  the moves in standard algebraic notation
+    """
+    tags, movetext = {}, []
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        for line in pgn_file:
+            tag = PGN_TAG.match(line)
+            if tag and movetext:  # tags of the next game
+                yield tags, split_movetext(" ".join(movetext))
+                tags, movetext = {}, []
+            if tag:
+                tags[tag.group(1)] = tag.group(2)
+            elif line.strip():
+                movetext.append(line)
+
+    if tags or movetext:
+        yield tags, split_movetext(" ".join(movetext))
+
+
+def split_movetext(movetext):
+    """
+        splits the movetext of a game into its moves
+
+        input parameter(s):
+        movetext --> moves of a PGN game with their numbers, comments and variations (str)
+
+        return parameter(s):
+        moves --> list of moves in standard algebraic notation
+    """
+    text = PGN_NOISE.sub(" ", movetext)
+
+    # drop (possibly nested) variations
+    main_line, depth = [], 0
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            main_line.append(char)
+    return "".join(main_line).split()
+
+
+def build_book(pgn_paths, book_path=BOOK_FILE, plies=BOOK_PLIES):
+    """
+        builds a book file from the games of PGN files. Every move of the first plies of each
+        game is weighted by the result of the game for the side that played it (2 for a win,
+        1 for a draw or unknown result, 0 for a loss) and moves that add up to weight 0 are
+        left out. Games with an invalid move only count up to that move
+
+        input parameter(s):
+        pgn_paths --> list of PGN files
+        book_path --> book file written. Default is BOOK_FILE
+        plies     --> number of plies of each game added to the book. Default is BOOK_PLIES
+
+        return parameter(s):
+        games   --> number of games read (int)
+        entries --> number of entries written (int)
+    """
+    weights = {}  # (zobrist key, move_id) --> weight
+    games = 0
+
+    for path in pgn_paths:
+        for tags, moves in read_pgn(path):
+            games += 1
+            gs = Game_state()
+            if "FEN" in tags:
+                gs.load_fen(tags["FEN"])
+            result_weights = RESULT_WEIGHTS.get(tags.get("Result"), UNKNOWN_RESULT_WEIGHT)
+
+            for san in moves[:plies]:
+                try:
+                    move = parse_san(gs, san)
+                except ValueError as error:
+                    print("{}: game {}: {}".format(path, games, error))
+                    break
+
+                entry = (gs.zobrist_key, move.move_id)
+                weights[entry] = weights.get(entry, 0) + result_weights[move.piece_moved[1]]
+                gs.make_move(move, True)
+
+    entries = sorted((key, move_id, min(weight, MAX_WEIGHT)) for (key, move_id), weight in weights.items() if weight)
+    with open(book_path, "wb") as book_file:
+        for entry in entries:
+            book_file.write(BOOK_ENTRY.pack(*entry))
+
+    return games, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opening book builder")
+    parser.add_argument("pgn", nargs="+", help="PGN files of the games to add to the book")
+    parser.add_argument("-o", "--output", default=BOOK_FILE, help="book file (default {})".format(BOOK_FILE))
+    parser.add_argument("-p", "--plies", type=int, default=BOOK_PLIES,
+                        help="plies of each game added to the book (default {})".format(BOOK_PLIES))
+    args = parser.parse_args()
+
+    games, entries = build_book(args.pgn, args.output, args.plies)
+    print("{} games, {} book entries written to {}".format(games, entries, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,482 @@
 # This is the main chess game engine that implements the rules of the game
 # and stores the state of the the chess board, including its pieces and moves
+#
+# The position is kept as bitboards: one 64 bit integer per piece (type + colour)
+# where bit (row * 8 + column) is set when that piece stands on the square, plus one
+# occupancy mask per colour. Row 0 is the dark back rank (rank 8) and column 0 is file a.
+# A mailbox copy of the position (self.board) is kept in sync for the GUI
+
+import random
+
+PIECES = ("pl", "nl", "bl", "rl", "ql", "kl", "pd", "nd", "bd", "rd", "qd", "kd")
+LIGHT_PIECES = PIECES[:6]
+DARK_PIECES = PIECES[6:]
+
+FULL_BOARD = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL_BOARD ^ FILE_A
+NOT_FILE_H = FULL_BOARD ^ FILE_H
+NOT_FILE_AB = FULL_BOARD ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL_BOARD ^ (FILE_G | FILE_H)
+ROW_2 = 0xFF << 16  # dark pawns after a single push (rank 6)
+ROW_5 = 0xFF << 40  # light pawns after a single push (rank 3)
+
+# (row, column) of each square index
+SQUARES = tuple((sq >> 3, sq & 7) for sq in range(64))
+
+# Move.move_id packs a move into 16 bits: start square (bits 0-5), end square (bits 6-11),
+# promotion piece (bits 12-13) and the kind of move (bits 14-15)
+MOVE_FLAGS = 3 << 14
+PROMOTION_FLAG = 1 << 14
+EN_PASSANT_FLAG = 2 << 14
+CASTLING_FLAG = 3 << 14
+PROMOTION_CODES = {"n": 0, "b": 1 << 12, "r": 2 << 12, "q": 3 << 12}
+FROM_TO = (1 << 12) - 1  # start and end square bits of Move.move_id (index of history tables)
+
+# rank of each piece type for ordering captures by most valuable victim / least valuable attacker
+MVV_LVA_VALUES = {"p": 1, "n": 2, "b": 3, "r": 4, "q": 5, "k": 6}
+
+# random keys for Zobrist hashing of positions (fixed seed so keys are stable across runs)
+zobrist_random = random.Random(2021)
+ZOBRIST_PIECES = {piece: tuple(zobrist_random.getrandbits(64) for sq in range(64)) for piece in PIECES}
+ZOBRIST_DARK_TO_MOVE = zobrist_random.getrandbits(64)
+# light king side, light queen side, dark king side, dark queen side
+ZOBRIST_CASTLING_RIGHTS = tuple(zobrist_random.getrandbits(64) for right in range(4))
+ZOBRIST_EN_PASSANT = tuple(zobrist_random.getrandbits(64) for col in range(8))
+# piece keys of the pawn-only hash (Game_state.pawn_key), zero for the other pieces
+ZOBRIST_PAWNS = {piece: ZOBRIST_PIECES[piece] if piece[0] == "p" else (0,) * 64 for piece in PIECES}
+
+# castling rights are kept as bit flags in a single int
+LIGHT_KING_SIDE, LIGHT_QUEEN_SIDE, DARK_KING_SIDE, DARK_QUEEN_SIDE = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = 15
+
+# zobrist key of every combination of castling rights
+ZOBRIST_CASTLING = tuple(
+    (ZOBRIST_CASTLING_RIGHTS[0] if rights & LIGHT_KING_SIDE else 0) ^
+    (ZOBRIST_CASTLING_RIGHTS[1] if rights & LIGHT_QUEEN_SIDE else 0) ^
+    (ZOBRIST_CASTLING_RIGHTS[2] if rights & DARK_KING_SIDE else 0) ^
+    (ZOBRIST_CASTLING_RIGHTS[3] if rights & DARK_QUEEN_SIDE else 0) for rights in range(16))
+
+# squares whose first use (move from or capture on) removes castling rights
+CASTLING_SQUARES = {60: LIGHT_KING_SIDE | LIGHT_QUEEN_SIDE, 63: LIGHT_KING_SIDE, 56: LIGHT_QUEEN_SIDE,
+                    4: DARK_KING_SIDE | DARK_QUEEN_SIDE, 7: DARK_KING_SIDE, 0: DARK_QUEEN_SIDE}
+
+
+def knight_attacks(bb):
+    """
+            squares attacked by the knights in a bitboard
+
+            input parameter(s):
+            bb --> bitboard of knights (int)
+
+            return parameter(s):
+            bitboard of attacked squares (int)
+    """
+    one = ((bb >> 1) & NOT_FILE_H) | ((bb << 1) & NOT_FILE_A)
+    two = ((bb >> 2) & NOT_FILE_GH) | ((bb << 2) & NOT_FILE_AB)
+    return ((one << 16) | (one >> 16) | (two << 8) | (two >> 8)) & FULL_BOARD
+
+
+def king_attacks(bb):
+    """
+            squares attacked by the kings in a bitboard
+
+            input parameter(s):
+            bb --> bitboard of kings (int)
+
+            return parameter(s):
+            bitboard of attacked squares (int)
+    """
+    attacks = ((bb >> 1) & NOT_FILE_H) | ((bb << 1) & NOT_FILE_A)
+    bb |= attacks
+    return (attacks | (bb << 8) | (bb >> 8)) & FULL_BOARD
+
+
+def pawn_attacks(bb, colour):
+    """
+            squares attacked by the pawns in a bitboard
+
+            input parameter(s):
+            bb     --> bitboard of pawns (int)
+            colour --> colour of the pawns ('l' moves up the board, 'd' moves down)
+
+            return parameter(s):
+            bitboard of attacked squares (int)
+    """
+    if colour == "l":
+        return ((bb >> 9) & NOT_FILE_H) | ((bb >> 7) & NOT_FILE_A)
+    return (((bb << 7) & NOT_FILE_H) | ((bb << 9) & NOT_FILE_A)) & FULL_BOARD
+
+
+# attacks of a single knight, king or pawn on each square
+KNIGHT_ATTACKS = tuple(knight_attacks(1 << sq) for sq in range(64))
+KING_ATTACKS = tuple(king_attacks(1 << sq) for sq in range(64))
+PAWN_ATTACKS = {colour: tuple(pawn_attacks(1 << sq, colour) for sq in range(64))
+                for colour in ("l", "d")}
+
+
+def ray(sq, direction):
+    """
+            squares from a square to the board edge along a direction (excluding the square)
+
+            input parameter(s):
+            sq        --> square index, row * 8 + column (int)
+            direction --> (row, column) step along the ray (tuple)
+
+            return parameter(s):
+            bitboard of the ray (int)
+    """
+    bb = 0
+    end_row = (sq >> 3) + direction[0]
+    end_col = (sq & 7) + direction[1]
+    while 0 <= end_row < 8 and 0 <= end_col < 8:
+        bb |= 1 << (end_row * 8 + end_col)
+        end_row += direction[0]
+        end_col += direction[1]
+    return bb
+
+
+# rays of each square along each direction. Rays in "increasing" directions run
+# towards higher square indices so their first blocker is the lowest set bit,
+# rays in "decreasing" directions find their first blocker in the highest set bit
+BISHOP_RAYS_INCREASING = tuple(tuple(ray(sq, d) for sq in range(64)) for d in ((1, -1), (1, 1)))
+BISHOP_RAYS_DECREASING = tuple(tuple(ray(sq, d) for sq in range(64)) for d in ((-1, -1), (-1, 1)))
+ROOK_RAYS_INCREASING = tuple(tuple(ray(sq, d) for sq in range(64)) for d in ((1, 0), (0, 1)))
+ROOK_RAYS_DECREASING = tuple(tuple(ray(sq, d) for sq in range(64)) for d in ((-1, 0), (0, -1)))
+
+
+def sliding_attacks(sq, occupied, increasing_rays, decreasing_rays):
+    """
+            squares attacked by a sliding piece, stopping at the first blocker in each direction
+
+            input parameter(s):
+            sq              --> square of the piece (int, row * 8 + column)
+            occupied        --> bitboard of all pieces on the board (int)
+            increasing_rays --> ray tables towards higher square indices
+            decreasing_rays --> ray tables towards lower square indices
+
+            return parameter(s):
+            bitboard of attacked squares (int)
+    """
+    attacks = 0
+    for rays in increasing_rays:
+        attacks_ray = rays[sq]
+        blockers = attacks_ray & occupied
+        if blockers:  # cut the ray behind the nearest blocker
+            attacks_ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= attacks_ray
+
+    for rays in decreasing_rays:
+        attacks_ray = rays[sq]
+        blockers = attacks_ray & occupied
+        if blockers:
+            attacks_ray ^= rays[blockers.bit_length() - 1]
+        attacks |= attacks_ray
+
+    return attacks
+
+
+def line_attack_table(sq, increasing_rays, decreasing_rays):
+    """
+            attacks of a sliding piece along one line (rank, file or diagonal) for every
+            arrangement of blockers on that line
+
+            input parameter(s):
+            sq              --> square of the piece (int, row * 8 + column)
+            increasing_rays --> ray table of the line towards higher square indices
+            decreasing_rays --> ray table of the line towards lower square indices
+
+            return parameter(s):
+            mask  --> bitboard of the line excluding the square (int)
+            table --> dictionary of blockers on the line (occupied & mask) to attacked squares
+    """
+    mask = increasing_rays[sq] | decreasing_rays[sq]
+    table = {}
+    blockers = 0
+    while True:  # every subset of the mask
+        table[blockers] = sliding_attacks(sq, blockers, (increasing_rays,), (decreasing_rays,))
+        blockers = (blockers - mask) & mask
+        if not blockers:
+            return mask, table
+
+
+# precomputed slider attacks per square and line (rank, file, diagonal, anti-diagonal),
+# so a slider's attacks are one lookup per line that already stops at the first blocker
+RANK_MASKS, RANK_ATTACKS = zip(*(line_attack_table(sq, ROOK_RAYS_INCREASING[1], ROOK_RAYS_DECREASING[1])
+                                 for sq in range(64)))
+FILE_MASKS, FILE_ATTACKS = zip(*(line_attack_table(sq, ROOK_RAYS_INCREASING[0], ROOK_RAYS_DECREASING[0])
+                                 for sq in range(64)))
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = zip(*(line_attack_table(sq, BISHOP_RAYS_INCREASING[1], BISHOP_RAYS_DECREASING[0])
+                                         for sq in range(64)))
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = zip(*(line_attack_table(sq, BISHOP_RAYS_INCREASING[0], BISHOP_RAYS_DECREASING[1])
+                                                   for sq in range(64)))
+
+
+def bishop_attacks(sq, occupied):
+    return DIAGONAL_ATTACKS[sq][occupied & DIAGONAL_MASKS[sq]] | \
+        ANTI_DIAGONAL_ATTACKS[sq][occupied & ANTI_DIAGONAL_MASKS[sq]]
+
+
+def rook_attacks(sq, occupied):
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+
+# squares a bishop or rook on each square attacks on an empty board
+BISHOP_LINES = tuple(DIAGONAL_MASKS[sq] | ANTI_DIAGONAL_MASKS[sq] for sq in range(64))
+ROOK_LINES = tuple(RANK_MASKS[sq] | FILE_MASKS[sq] for sq in range(64))
+
+# squares that must be empty and squares that must not be attacked for castling
+# (keys = castling right flag)
+CASTLING_EMPTY = {LIGHT_KING_SIDE: 3 << 61, LIGHT_QUEEN_SIDE: 7 << 57,
+                  DARK_KING_SIDE: 3 << 5, DARK_QUEEN_SIDE: 7 << 1}
+CASTLING_SAFE = {LIGHT_KING_SIDE: 7 << 60, LIGHT_QUEEN_SIDE: 7 << 58,
+                 DARK_KING_SIDE: 7 << 4, DARK_QUEEN_SIDE: 7 << 2}
+
+
+def squares_between(sq):
+    """
+            squares strictly between a square and every square sharing a rank, file or diagonal with it
+
+            input parameter(s):
+            sq --> square index, row * 8 + column (int)
+
+            return parameter(s):
+            list of 64 bitboards (0 for squares not on a common line)
+    """
+    between = [0] * 64
+    for d in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)):
+        squares = 0
+        end_row = (sq >> 3) + d[0]
+        end_col = (sq & 7) + d[1]
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            between[end_row * 8 + end_col] = squares
+            squares |= 1 << (end_row * 8 + end_col)
+            end_row += d[0]
+            end_col += d[1]
+    return between
+
+
+BETWEEN = tuple(tuple(squares_between(sq)) for sq in range(64))
+
+
+# evaluation of the position (kept up to date by Game_state.score and end_game_score): value of
+# each piece and bonus or penalty of each piece on each square (positive favours light, negative dark)
+piece_values = {
+    "kl": 20000, "ql": 900, "rl": 500, "bl": 330, "nl": 320, "pl": 100, "  ": 0,
+    "kd": -20000, "qd": -900, "rd": -500, "bd": -330, "nd": -320, "pd": -100
+}
+
+square_values = {
+    "pl": [
+        [55, 55, 55, 55, 55, 55, 55, 55],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5,  5, 10, 25, 25, 10,  5,  5],
+        [0,  0,  0, 20, 20,  0,  0,  0],
+        [5, -5, -10,  0,  0, -10, -5,  5],
+        [5, 10, 10, -20, -20, 10, 10,  5],
+        [0,  0,  0,  0,  0,  0,  0,  0]
+    ],
+
+    "nl": [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20,  0,  0,  0,  0, -20, -40],
+        [-30,  0, 10, 15, 15, 10,  0, -30],
+        [-30,  5, 15, 20, 20, 15,  5, -30],
+        [-30,  0, 15, 20, 20, 15,  0, -30],
+        [-30,  5, 10, 15, 15, 10,  5, -30],
+        [-40, -20,  0,  5,  5,  0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50]
+    ],
+
+    "bl": [
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10,  0,  0,  0,  0,  0,  0, -10],
+        [-10,  0,  5, 10, 10,  5,  0, -10],
+        [-10,  5,  5, 10, 10,  5,  5, -10],
+        [-10,  0, 10, 10, 10, 10,  0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10,  5,  0,  0,  0,  0,  5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20]
+    ],
+
+    "rl": [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [5, 10, 10, 10, 10, 10, 10,  5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [-5,  0,  0,  0,  0,  0,  0, -5],
+        [0,  0,  0,  5,  5,  0,  0,  0]
+    ],
+
+    "ql": [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10,  0,  0,  0,  0,  0,  0, -10],
+        [-10,  0,  5,  5,  5,  5,  0, -10],
+        [-5,  0,  5,  5,  5,  5,  0, -5],
+        [0,  0,  5,  5,  5,  5,  0, -5],
+        [-10,  5,  5,  5,  5,  5,  0, -10],
+        [-10,  0,  5,  0,  0,  0,  0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20]
+    ],
+
+    # middle game
+    "kl": [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20,  0,  0,  0,  0, 20, 20],
+        [20, 30, 10,  0,  0, 10, 30, 20]
+    ],
+
+    "  ": [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+
+    # middle game
+    "kd": [
+        [-20, -30, -10, 0,  0, -10, -30, -20],
+        [-20, -20, 0,  0,  0, 0, -20, -20],
+        [10, 20, 20, 20, 20, 20, 20, 10],
+        [20, 30, 30, 40, 40, 30, 30, 20],
+        [30, 40, 40, 50, 50, 40, 40, 30],
+        [30, 40, 40, 50, 50, 40, 40, 30],
+        [30, 40, 40, 50, 50, 40, 40, 30],
+        [30, 40, 40, 50, 50, 40, 40, 30]
+    ],
+
+    "pd": [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [-5, -10, -10, 20, 20, -10, -10, -5],
+        [-5, 5, 10,  0,  0, 10,  5,  5],
+        [0,  0,  0, -20, -20,  0,  0,  0],
+        [-5, -5, -10, -25, -25, -10, -5, -5],
+        [-10, -10, -20, -30, -30, -20, -10, -10],
+        [-50, -50, -50, -50, -50, -50, -50, -50],
+        [-55, -55, -55, -55, -55, -55, -55, -55]
+    ],
+
+    "nd": [
+        [50, 40, 30, 30, 30, 30, 40, 50],
+        [40, 20,  0, -5, -5,  0, 20, 40],
+        [30, -5, -10, -15, -15, -10, -5, 30],
+        [30,  0, -15, -20, -20, -15,  0, 30],
+        [30, -5, -15, -20, -20, -15, -5, 30],
+        [30, -0, -10, -15, -15, -10,  0, 30],
+        [40, 20,  0,  0,  0,  0, 20, 40],
+        [50, 40, 30, 30, 30, 30, 40, 50]
+    ],
+
+    "bd": [
+        [20, 10, 10, 10, 10, 10, 10, 20],
+        [10, -5,  0,  0,  0,  0, -5, 10],
+        [10, -10, -10, -10, -10, -10, -10, 10],
+        [10,  0, -10, -10, -10, -10,  0, 10],
+        [10, -5, -5, -10, -10, -5, -5, 10],
+        [10,  0, -5, -10, -10, -5,  0, 10],
+        [10,  0,  0,  0,  0,  0,  0, 10],
+        [20, 10, 10, 10, 10, 10, 10, 20]
+    ],
+
+    "rd": [
+        [0,  0,  0, -5, -5,  0,  0,  0],
+        [5,  0,  0,  0,  0,  0,  0,  5],
+        [5,  0,  0,  0,  0,  0,  0,  5],
+        [5,  0,  0,  0,  0,  0,  0,  5],
+        [5,  0,  0,  0,  0,  0,  0,  5],
+        [5,  0,  0,  0,  0,  0,  0,  5],
+        [-5, -10, -10, -10, -10, -10, -10, -5],
+        [0,  0,  0,  0,  0,  0,  0,  0]
+    ],
+
+    "qd": [
+        [20, 10, 10,  5,  5, 10, 10, 20],
+        [10,  0,  5,  0,  0,  0,  0, 10],
+        [10,  -5, -5, -5, -5, -5, 0, 10],
+        [0,  0, -5, -5,  -5, -5,  0,  5],
+        [5,  0, -5, -5, -5, -5,  0,  5],
+        [10,  0, -5, -5, -5, -5,  0, 10],
+        [10,  0,  0,  0,  0,  0,  0, 10],
+        [20, 10, 10,  5,  5, 10, 10, 20]
+    ]
+
+}
+
+# square values of the end game, where the king should head for the centre and the pawns for
+# promotion, the further advanced the better (knights, bishops, rooks and queens keep their
+# middle game square values)
+end_game_square_values = dict(square_values, **{
+    "pl": [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [80, 80, 80, 80, 80, 80, 80, 80],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [30, 30, 30, 30, 30, 30, 30, 30],
+        [20, 20, 20, 20, 20, 20, 20, 20],
+        [10, 10, 10, 10, 10, 10, 10, 10],
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [0,  0,  0,  0,  0,  0,  0,  0]
+    ],
+
+    "pd": [
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [0,  0,  0,  0,  0,  0,  0,  0],
+        [-10, -10, -10, -10, -10, -10, -10, -10],
+        [-20, -20, -20, -20, -20, -20, -20, -20],
+        [-30, -30, -30, -30, -30, -30, -30, -30],
+        [-50, -50, -50, -50, -50, -50, -50, -50],
+        [-80, -80, -80, -80, -80, -80, -80, -80],
+        [0,  0,  0,  0,  0,  0,  0,  0]
+    ],
+
+    "kl": [
+        [-50, -40, -30, -20, -20, -30, -40, -50],
+        [-30, -20, -10,  0,  0, -10, -20, -30],
+        [-30, -10, 20, 30, 30, 20, -10, -30],
+        [-30, -10, 30, 40, 40, 30, -10, -30],
+        [-30, -10, 30, 40, 40, 30, -10, -30],
+        [-30, -10, 20, 30, 30, 20, -10, -30],
+        [-30, -30,  0,  0,  0,  0, -30, -30],
+        [-50, -30, -30, -30, -30, -30, -30, -50]
+    ],
+
+    "kd": [
+        [50, 30, 30, 30, 30, 30, 30, 50],
+        [30, 30,  0,  0,  0,  0, 30, 30],
+        [30, 10, -20, -30, -30, -20, 10, 30],
+        [30, 10, -30, -40, -40, -30, 10, 30],
+        [30, 10, -30, -40, -40, -30, 10, 30],
+        [30, 10, -20, -30, -30, -20, 10, 30],
+        [30, 20, 10,  0,  0, 10, 20, 30],
+        [50, 40, 30, 20, 20, 30, 40, 50]
+    ]
+})
+
+# piece value + square value of every piece on every square index (middle game and end game)
+PIECE_SQUARE_VALUES = {piece: tuple(piece_values[piece] + square_values[piece][sq >> 3][sq & 7] for sq in range(64))
+                       for piece in PIECES}
+END_GAME_PIECE_SQUARE_VALUES = {piece: tuple(piece_values[piece] + end_game_square_values[piece][sq >> 3][sq & 7]
+                                             for sq in range(64)) for piece in PIECES}
+
+# game phase: knights and bishops count 1, rooks 2 and queens 4, so the starting position is at
+# MAX_PHASE (middle game) and a board with only kings and pawns at 0 (end game)
+PHASE_VALUES = {piece: {"n": 1, "b": 1, "r": 2, "q": 4}.get(piece[0], 0) for piece in PIECES}
+MAX_PHASE = 24
+
 
 class Game_state():
 
@@ -18,6 +495,10 @@ class Game_state():
 
                 empty board square = "  " ---> double empty space
 
+                The board is a view of the bitboards (self.bitboards and self.occupancy) that
+                the move generators work on. It is kept in sync by make_move and undo_move and
+                should not be written to directly
+
         """
 
         self.board = [
@@ -33,504 +514,570 @@ class Game_state():
 
         self.light_to_move = True  # True = light's turn to play; False = dark's turn to play
         self.move_log = []        # keeps a log of all moves made withing a game
-        self.en_passant = [] 	  # flags possible en-passant moves
-        self.castling = [] 		  # flags possible casling moves
+        # keeps the irreversible state before each logged move (castling rights,
+        # en-passant square, piece captured, halfmove clock) for undoing moves
+        self.state_log = []
+        self.en_passant_square = None  # square skipped by the last double pawn advance (int)
+        self.halfmove_clock = 0  # moves since the last capture or pawn move (fifty-move rule)
+        self.start_ply = 0  # plies played before the first logged move (from a loaded FEN's fullmove number)
         self.move_piece = {"p": self.get_pawn_moves, "r": self.get_rook_moves,
                            "q": self.get_queen_moves, "k": self.get_king_moves,
                            "b": self.get_bishop_moves, "n": self.get_knight_moves}
 
-        self.light_king_location = (7, 4)
-        self.dark_king_location = (0, 4)
         # king is being attacked (initiated by opposing piece)
         self.check_mate = False
         # no valid moves (king cornered; initiated by king)
         self.stale_mate = False
+        # castling rights available (king and rook not moved), combination of LIGHT_KING_SIDE,
+        # LIGHT_QUEEN_SIDE, DARK_KING_SIDE and DARK_QUEEN_SIDE flags
+        self.castling_rights = ALL_CASTLING_RIGHTS
+
+        self.bitboards = {}  # bitboard of each piece (keys = piece eg "kl")
+        self.occupancy = {}  # bitboard of all pieces of each colour (keys = "l" or "d")
+        self.piece_squares = {}  # set of squares (row * 8 + column) of each piece (keys = piece eg "kl")
+        self.score = 0  # sum of the piece values and square values of all pieces (light - dark)
+        self.end_game_score = 0  # same sum with the end game square values
+        self.phase = 0  # sum of the PHASE_VALUES of all pieces (MAX_PHASE at the start)
+        self.refresh_bitboards()
+
+        self.zobrist_key = 0  # 64 bit hash of the current position
+        self.pawn_key = 0  # 64 bit hash of the pawns only (pawn structure)
+        self.zobrist_history = []  # zobrist keys of the positions before each logged move
+        self.compute_zobrist_key()
+
+    @property
+    def light_king_side_castle(self):
         # light king side castle available (king and right rook not moved)
-        self.light_king_side_castle = True
+        return bool(self.castling_rights & LIGHT_KING_SIDE)
+
+    @property
+    def light_queen_side_castle(self):
         # light queen side castle available (king and left rook not moved)
-        self.light_queen_side_castle = True
+        return bool(self.castling_rights & LIGHT_QUEEN_SIDE)
+
+    @property
+    def dark_king_side_castle(self):
         # dark king side castle available (king and right rook not moved)
-        self.dark_king_side_castle = True
+        return bool(self.castling_rights & DARK_KING_SIDE)
+
+    @property
+    def dark_queen_side_castle(self):
         # dark queen side castle available (king and left rook not moved)
-        self.dark_queen_side_castle = True
+        return bool(self.castling_rights & DARK_QUEEN_SIDE)
+
+    @property
+    def light_king_location(self):
+        # (row, col) of the light king, read from its bitboard
+        sq = self.bitboards["kl"].bit_length() - 1
+        return sq >> 3, sq & 7
 
-    def get_pawn_moves(self, r, c, moves):
+    @property
+    def dark_king_location(self):
+        # (row, col) of the dark king, read from its bitboard
+        sq = self.bitboards["kd"].bit_length() - 1
+        return sq >> 3, sq & 7
+
+    def refresh_bitboards(self):
         """
-                Calculates all possible pawn moves for a given color (light or dark)
-                and appends them to a list
+                rebuilds the bitboards, occupancy masks, piece lists and score from self.board
 
                 input parameter(s):
-                r     --> starting row (int)
-                c     --> starting colum (int)
-                moves --> possible moves container (list)
+                None
 
                 return parameter(s):
                 None
         """
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {"l": 0, "d": 0}
+        self.piece_squares = {piece: set() for piece in PIECES}
+        self.score = self.end_game_score = self.phase = 0
+
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "  ":
+                    bit = 1 << (r * 8 + c)
+                    self.bitboards[piece] |= bit
+                    self.occupancy[piece[1]] |= bit
+                    self.piece_squares[piece].add(r * 8 + c)
+                    self.score += PIECE_SQUARE_VALUES[piece][r * 8 + c]
+                    self.end_game_score += END_GAME_PIECE_SQUARE_VALUES[piece][r * 8 + c]
+                    self.phase += PHASE_VALUES[piece]
+
+    def compute_zobrist_key(self):
+        """
+                hashes the current position from scratch (pieces, side to move, castling rights
+                and en-passant square), and its pawns alone (self.pawn_key). make_move and
+                undo_move keep the keys up to date, this is only needed after the position is set
+                up or edited directly
 
-        if self.light_to_move:  # light pawns
-            if r-1 >= 0 and self.board[r-1][c] == "  ":  # one square advance
-                moves.append(Move((r, c), (r-1, c), self.board))
+                input parameter(s):
+                None
 
-                if r == 6 and self.board[r-2][c] == "  ":  # two square advance
-                    moves.append(Move((r, c), (r-2, c), self.board))
+                return parameter(s):
+                zobrist_key --> 64 bit hash of the position (int)
+        """
+        key = 0
+        for piece in PIECES:
+            for sq in self.piece_squares[piece]:
+                key ^= ZOBRIST_PIECES[piece][sq]
 
-            if c-1 >= 0:  # left captures
-                # dark piece present
-                if r-1 >= 0 and self.board[r-1][c-1][1] == "d":
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
+        self.pawn_key = 0
+        for piece in ("pl", "pd"):
+            for sq in self.piece_squares[piece]:
+                self.pawn_key ^= ZOBRIST_PAWNS[piece][sq]
 
-            if c+1 <= len(self.board[0]) - 1:  # right captures
-                if r-1 >= 0 and self.board[r-1][c+1][1] == "d":
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
+        if not self.light_to_move:
+            key ^= ZOBRIST_DARK_TO_MOVE
 
-        else:  # dark pawns
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        self.zobrist_key = key ^ self.en_passant_key()
+        return self.zobrist_key
 
-            if r+1 <= 7 and self.board[r+1][c] == "  ":  # one square advance
-                moves.append(Move((r, c), (r+1, c), self.board))
+    def en_passant_key(self):
+        """
+                zobrist key of the en-passant square. The square is only hashed when a pawn of
+                the side to move can capture onto it, so positions that only differ by an
+                unusable en-passant square share a key
 
-                if r == 1 and self.board[r+2][c] == "  ":  # two square advance
-                    moves.append(Move((r, c), (r+2, c), self.board))
+                input parameter(s):
+                None
 
-            if c-1 >= 0:  # left captures
-                # light piece present
-                if r+1 <= 7 and self.board[r+1][c-1][1] == "l":
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
+                return parameter(s):
+                key --> zobrist key of the en-passant file or 0 (int)
+        """
+        if self.en_passant_square is None:
+            return 0
 
-            if c+1 <= len(self.board[0]) - 1:  # right captures
-                if r+1 <= 7 and self.board[r+1][c+1][1] == "l":
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
+        turn, opp_turn = ("l", "d") if self.light_to_move else ("d", "l")
+        if PAWN_ATTACKS[opp_turn][self.en_passant_square] & self.bitboards["p" + turn]:
+            return ZOBRIST_EN_PASSANT[self.en_passant_square & 7]
+        return 0
 
-    def get_bishop_moves(self, r, c, moves):
+    def put_piece(self, piece, sq):
         """
-                calculates all possible bishop moves for a given colour (light or dark)
-                and appends them to a list
+                places a piece on an empty square of the bitboards and the board view
 
-                input parameters:
-                r     --> starting row (int)
-                c     --> starting column (int)
-                moves --> posiible moves container (list)
+                input parameter(s):
+                piece --> piece to be placed eg "ql" (str)
+                sq    --> square index, row * 8 + column (int)
 
                 return parameter(s):
                 None
         """
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = "d" if self.light_to_move else "l"
-
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    destination = self.board[end_row][end_col]
-                    if destination == "  ":
-                        moves.append(
-                            Move((r, c), (end_row, end_col), self.board))
-                    elif destination[1] == enemy_color:
-                        moves.append(
-                            Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # friendly piece
-                        break
-                else:  # off board
-                    break
-
-    def get_knight_moves(self, r, c, moves):
-        directions = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1))
-        enemy_color = "d" if self.light_to_move else "l"
+        bit = 1 << sq
+        self.bitboards[piece] |= bit
+        self.occupancy[piece[1]] |= bit
+        self.piece_squares[piece].add(sq)
+        self.score += PIECE_SQUARE_VALUES[piece][sq]
+        self.end_game_score += END_GAME_PIECE_SQUARE_VALUES[piece][sq]
+        self.phase += PHASE_VALUES[piece]
+        self.board[sq >> 3][sq & 7] = piece
+        self.zobrist_key ^= ZOBRIST_PIECES[piece][sq]
+        self.pawn_key ^= ZOBRIST_PAWNS[piece][sq]
+
+    def remove_piece(self, piece, sq):
+        """
+                removes a piece from the bitboards and the board view
 
-        for d in directions:
-            end_row = r + d[0]
-            end_col = c + d[1]
+                input parameter(s):
+                piece --> piece to be removed eg "ql" (str)
+                sq    --> square index, row * 8 + column (int)
 
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                destination = self.board[end_row][end_col]
-                if destination[1] == enemy_color or destination == "  ":
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+                return parameter(s):
+                None
+        """
+        mask = FULL_BOARD ^ (1 << sq)
+        self.bitboards[piece] &= mask
+        self.occupancy[piece[1]] &= mask
+        self.piece_squares[piece].discard(sq)
+        self.score -= PIECE_SQUARE_VALUES[piece][sq]
+        self.end_game_score -= END_GAME_PIECE_SQUARE_VALUES[piece][sq]
+        self.phase -= PHASE_VALUES[piece]
+        self.board[sq >> 3][sq & 7] = "  "
+        self.zobrist_key ^= ZOBRIST_PIECES[piece][sq]
+        self.pawn_key ^= ZOBRIST_PAWNS[piece][sq]
+
+    def place_piece(self, piece, sq):
+        """
+                places a piece on an empty square of the bitboards, piece list and board view
+                only (undo_move restores the scores and keys saved by make_move)
 
-    def get_king_moves(self, r, c, moves):
-        directions = ((-1, -1), (-1, 0), (-1, 1), (0, -1),
-                      (0, 1), (1, -1), (1, 0), (1, 1))
-        enemy_color = "d" if self.light_to_move else "l"
-
-        for d in directions:
-            end_row = r + d[0]
-            end_col = c + d[1]
-
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                destination = self.board[end_row][end_col]
-                if destination[1] == enemy_color or destination == "  ":
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-
-        # castling
-
-        # light king side
-        if self.light_to_move and self.light_king_side_castle:
-
-            # if path is clear
-            if self.board[7][5] == "  " and self.board[7][6] == "  ":
-
-                # if path not under attack
-                if (not self.is_square_attacked(7, 5)) and (not self.is_square_attacked(7, 6)):
-                    moves.append(Move((7, 4), (7, 6), self.board))
-                    self.castling.append(Move((7, 4), (7, 6), self.board))
-
-        # light queen side
-        if self.light_to_move and self.light_queen_side_castle:
-
-            # if path is clear
-            if self.board[7][1] == "  " and self.board[7][2] == "  " and self.board[7][3] == "  ":
-
-                # if path not under attack
-                if (not self.is_square_attacked(7, 1)) and (not self.is_square_attacked(7, 2)) and (not self.is_square_attacked(7, 3)):
-                    moves.append(Move((7, 4), (7, 2), self.board))
-                    self.castling.append(Move((7, 4), (7, 2), self.board))
-
-        # dark king side
-        if not self.light_to_move and self.dark_king_side_castle:
-
-            # if path is clear
-            if self.board[0][5] == "  " and self.board[0][6] == "  ":
-
-                # if path not under attack
-                if (not self.is_square_attacked(0, 5)) and (not self.is_square_attacked(0, 6)):
-                    moves.append(Move((0, 4), (0, 6), self.board))
-                    self.castling.append(Move((0, 4), (0, 6), self.board))
-
-        # dark queen side
-        if not self.light_to_move and self.dark_queen_side_castle:
-
-            # if path is clear
-            if self.board[0][1] == "  " and self.board[0][2] == "  " and self.board[0][3] == "  ":
-
-                # if path not under attach
-                if (not self.is_square_attacked(0, 1)) and (not self.is_square_attacked(0, 2)) and (not self.is_square_attacked(0, 3)):
-                    moves.append(Move((0, 4), (0, 2), self.board))
-                    self.castling.append(Move((0, 4), (0, 2), self.board))
-
-    def get_rook_moves(self, r, c, moves):
-
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = "d" if self.light_to_move else "l"
-
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-
-                if 0 <= end_row < 8 and 0 <= end_col < 8:  # on board
-                    destination = self.board[end_row][end_col]
-                    if destination == "  ":  # empty
-                        moves.append(
-                            Move((r, c), (end_row, end_col), self.board))
-                    elif destination[1] == enemy_color:
-                        moves.append(
-                            Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # friendly piece
-                        break
-                else:  # off board
-                    break
+                input parameter(s):
+                piece --> piece to be placed eg "ql" (str)
+                sq    --> square index, row * 8 + column (int)
 
-    def get_queen_moves(self, r, c, moves):
-        self.get_bishop_moves(r, c, moves)
-        self.get_rook_moves(r, c, moves)
+                return parameter(s):
+                None
+        """
+        bit = 1 << sq
+        self.bitboards[piece] |= bit
+        self.occupancy[piece[1]] |= bit
+        self.piece_squares[piece].add(sq)
+        self.board[sq >> 3][sq & 7] = piece
 
-    def make_move(self, move, look_ahead_mode=False):
+    def lift_piece(self, piece, sq):
         """
-                moves pieces on the board
+                removes a piece from the bitboards, piece list and board view only (undo_move
+                restores the scores and keys saved by make_move)
 
-                input parameters:
-                move     --> move to be made (Move object)
-                look_ahead_mode   --> flag to ignore castling or not (during thinking mode)
+                input parameter(s):
+                piece --> piece to be removed eg "ql" (str)
+                sq    --> square index, row * 8 + column (int)
 
                 return parameter(s):
                 None
         """
-        # if self.move_log:
-        # print(self.move_log[-1])
-
-        self.board[move.start_row][move.start_col] = "  "
-        self.board[move.end_row][move.end_col] = move.piece_moved
-        # if self.en_passant and not look_ahead_mode:
-        # 	print(self.en_passant)
-        # handles en-passant moves
-        if not look_ahead_mode and move in self.en_passant:
-            if self.light_to_move:
-                move.en_passant_captured = self.board[move.end_row +
-                                                      1][move.end_col]
-                self.board[move.end_row+1][move.end_col] = "  "
-            else:
-                move.en_passant_captured = self.board[move.end_row -
-                                                      1][move.end_col]
-                self.board[move.end_row-1][move.end_col] = "  "
+        bit = 1 << sq
+        self.bitboards[piece] ^= bit
+        self.occupancy[piece[1]] ^= bit
+        self.piece_squares[piece].discard(sq)
+        self.board[sq >> 3][sq & 7] = "  "
 
-        self.move_log.append(move)  # log move
-        # handles castling moves
-        if not look_ahead_mode and move in self.castling:
-
-            # determine rook to be castled
-            if move.end_col == 2:
-                move.castling_rook = (move.start_row, 0)
-                self.board[move.start_row][0] = "  "
-                self.board[move.end_row][3] = "r" + \
-                    self.board[move.end_row][move.end_col][1]  # castle rook
-            elif move.end_col == 6:
-                move.castling_rook = (move.start_row, 7)
-                self.board[move.start_row][7] = "  "
-                self.board[move.end_row][5] = "r" + \
-                    self.board[move.end_row][move.end_col][1]  # castle rook
+    def append_moves(self, r, c, targets, moves):
+        """
+                appends a move from (r, c) to every square of a bitboard
 
-        self.light_to_move = not self.light_to_move  # next player to move
+                input parameter(s):
+                r       --> starting row (int)
+                c       --> starting column (int)
+                targets --> bitboard of destination squares (int)
+                moves   --> possible moves container (list)
 
-        if not look_ahead_mode:
-            self.castling = []  # reset castling
-            self.en_passant = []  # reset en-passant
+                return parameter(s):
+                None
+        """
+        while targets:
+            bit = targets & -targets
+            end = bit.bit_length() - 1
+            moves.append(Move(SQUARES[r * 8 + c], SQUARES[end], self.board))
+            targets ^= bit
 
-            # dark en-passant
-            if (move.start_row == 6 and move.piece_moved == "pl" and move.start_row - move.end_row == 2):
+    def get_pawn_moves(self, r, c, moves, allowed=FULL_BOARD):
+        """
+                Calculates all possible pawn moves for a given color (light or dark)
+                and appends them to a list
 
-                # from left of light pawn
-                if (move.end_col - 1 >= 0 and self.board[move.end_row][move.end_col-1] == "pd"):
-                    self.en_passant.append(
-                        Move((move.end_row, move.end_col-1), (move.end_row+1, move.end_col), self.board))
+                input parameter(s):
+                r       --> starting row (int)
+                c       --> starting colum (int)
+                moves   --> possible moves container (list)
+                allowed --> bitboard of squares the piece may move to. Default is all squares
+                            (en-passant captures are included if it holds the en-passant square
+                            or the pawn being captured)
+
+                return parameter(s):
+                None
+        """
+        sq = r * 8 + c
+        occupied = self.occupancy["l"] | self.occupancy["d"]
+
+        if self.light_to_move:  # light pawns
+            colour, enemy, forward, double_row = "l", "d", -8, 6
+        else:  # dark pawns
+            colour, enemy, forward, double_row = "d", "l", 8, 1
+
+        targets = 0
+        end = sq + forward
+        if 0 <= end < 64 and not (occupied >> end) & 1:  # one square advance
+            targets |= 1 << end
+
+            # two square advance
+            if r == double_row and not (occupied >> (end + forward)) & 1:
+                targets |= 1 << (end + forward)
+
+        # captures (including en-passant)
+        targets = (targets | (PAWN_ATTACKS[colour][sq] & self.occupancy[enemy])) & allowed
+        if self.en_passant_square is not None and \
+                allowed & ((1 << self.en_passant_square) | (1 << (self.en_passant_square - forward))):
+            targets |= PAWN_ATTACKS[colour][sq] & (1 << self.en_passant_square)
+
+        while targets:
+            bit = targets & -targets
+            end = bit.bit_length() - 1
+            if end < 8 or end >= 56:  # promotion
+                for promotion in ("q", "r", "b", "n"):
+                    moves.append(Move(SQUARES[sq], SQUARES[end], self.board, promotion))
+            else:
+                moves.append(Move(SQUARES[sq], SQUARES[end], self.board))
+            targets ^= bit
 
-                # from right of light pawn
-                elif (move.end_col + 1 <= len(self.board[0])-1 and self.board[move.end_row][move.end_col+1] == "pd"):
-                    self.en_passant.append(Move(
-                        (move.end_row, move.start_col+1), (move.end_row+1, move.end_col), self.board))
+    def get_bishop_moves(self, r, c, moves, allowed=FULL_BOARD):
+        """
+                calculates all possible bishop moves for a given colour (light or dark)
+                and appends them to a list
 
-            # light en-passant
-            if (move.start_row == 1 and move.piece_moved == "pd" and move.end_row - move.start_row == 2):
+                input parameters:
+                r       --> starting row (int)
+                c       --> starting column (int)
+                moves   --> posiible moves container (list)
+                allowed --> bitboard of squares the piece may move to. Default is all squares
 
-                # from left of dark pawn
-                if (move.end_col - 1 >= 0 and self.board[move.end_row][move.end_col-1] == "pl"):
-                    self.en_passant.append(Move(
-                        (move.end_row, move.start_col-1), (move.end_row-1, move.end_col), self.board))
+                return parameter(s):
+                None
+        """
+        own = self.occupancy["l" if self.light_to_move else "d"]
+        occupied = self.occupancy["l"] | self.occupancy["d"]
+        self.append_moves(r, c, bishop_attacks(r * 8 + c, occupied) & ~own & allowed, moves)
 
-                # from right of dark pawn
-                elif (move.end_col + 1 <= len(self.board[0])-1 and self.board[move.end_row][move.end_col+1] == "pl"):
-                    self.en_passant.append(
-                        Move((move.end_row, move.end_col+1), (move.end_row-1, move.end_col), self.board))
+    def get_knight_moves(self, r, c, moves, allowed=FULL_BOARD):
+        own = self.occupancy["l" if self.light_to_move else "d"]
+        self.append_moves(r, c, KNIGHT_ATTACKS[r * 8 + c] & ~own & allowed, moves)
 
-        # update king's position
-        if move.piece_moved == "kl":
-            self.light_king_location = (move.end_row, move.end_col)
+    def get_king_moves(self, r, c, moves):
+        own = self.occupancy["l" if self.light_to_move else "d"]
+        self.append_moves(r, c, KING_ATTACKS[r * 8 + c] & ~own, moves)
+        self.get_castling_moves(r, c, moves)
 
-            if not look_ahead_mode:
+    def get_castling_moves(self, r, c, moves, attacked=None):
+        """
+                appends castling moves of the king on (r, c) if the rights remain, the king
+                is not in check and the path is clear and not under attack
 
-                # non castling king move
-                if not move.castling_rook:
-                    self.light_king_side_castle = False
-                    self.light_queen_side_castle = False
+                input parameter(s):
+                r        --> king row (int)
+                c        --> king column (int)
+                moves    --> possible moves container (list)
+                attacked --> bitboard of squares attacked by the opponent. Default is None
+                             (computed when needed)
 
-                # castling king moves
-                # queen side castled
-                elif move.castling_rook and move.end_col == 2:
-                    self.light_queen_side_castle = False
+                return parameter(s):
+                None
+        """
+        if self.light_to_move:
+            row, king_side, queen_side, opp_turn = 7, LIGHT_KING_SIDE, LIGHT_QUEEN_SIDE, "d"
+        else:
+            row, king_side, queen_side, opp_turn = 0, DARK_KING_SIDE, DARK_QUEEN_SIDE, "l"
+        king_side &= self.castling_rights
+        queen_side &= self.castling_rights
 
-                # king side castled
-                elif move.castling_rook and move.end_col == 6:
-                    self.light_king_side_castle = False
+        if (king_side or queen_side) and (r, c) == (row, 4):
+            occupied = self.occupancy["l"] | self.occupancy["d"]
+            if attacked is None:
+                attacked = self.attacked_squares(opp_turn, occupied)
 
-        elif move.piece_moved == "kd":
-            self.dark_king_location = (move.end_row, move.end_col)
+            # king side
+            if king_side and not occupied & CASTLING_EMPTY[king_side] and not attacked & CASTLING_SAFE[king_side]:
+                moves.append(Move((row, 4), (row, 6), self.board))
 
-            if not look_ahead_mode:
+            # queen side
+            if queen_side and not occupied & CASTLING_EMPTY[queen_side] and not attacked & CASTLING_SAFE[queen_side]:
+                moves.append(Move((row, 4), (row, 2), self.board))
 
-                # non castling king move
-                if not move.castling_rook:
-                    self.dark_king_side_castle = False
-                    self.dark_queen_side_castle = False
+    def get_rook_moves(self, r, c, moves, allowed=FULL_BOARD):
+        own = self.occupancy["l" if self.light_to_move else "d"]
+        occupied = self.occupancy["l"] | self.occupancy["d"]
+        self.append_moves(r, c, rook_attacks(r * 8 + c, occupied) & ~own & allowed, moves)
 
-                # castling king moves
-                # queen side castled
-                elif move.castling_rook and move.end_col == 2:
-                    self.dark_queen_side_castle = False
+    def get_queen_moves(self, r, c, moves, allowed=FULL_BOARD):
+        self.get_bishop_moves(r, c, moves, allowed)
+        self.get_rook_moves(r, c, moves, allowed)
 
-                # king side castled
-                elif move.castling_rook and move.end_col == 6:
-                    self.dark_king_side_castle = False
+    def make_move(self, move, look_ahead_mode=False):
+        """
+                moves pieces on the board (including castling rooks, en-passant captures
+                and pawn promotions). The piece moved is shifted on its bitboard in one step and
+                only captures, promotions and castling go through remove_piece and put_piece
 
-        # check rook moves for castling
+                input parameters:
+                move     --> move to be made (Move object)
+                look_ahead_mode   --> True for moves made by a search. Moves are made the same
+                                      way in both modes, the flag is kept to match undo_move.
+                                      Default is False
 
-        if not look_ahead_mode:
-            # light rooks
-            if move.start_row == 7 and move.start_col == 0:
-                self.light_queen_side_castle = False
-            elif move.start_row == 7 and move.start_col == 7:
-                self.light_king_side_castle = False
+                return parameter(s):
+                None
+        """
+        move_id = move.move_id
+        start = move_id & 63
+        end = move_id >> 6 & 63
+        piece = move.piece_moved
+        colour = piece[1]
+        flag = move_id & MOVE_FLAGS
+        captured = move.en_passant_captured if flag == EN_PASSANT_FLAG else move.piece_captured
+
+        # save irreversible state (and the scores and pawn key, which undo_move restores instead of
+        # recomputing them)
+        self.state_log.append((self.castling_rights, self.en_passant_square, captured, self.halfmove_clock,
+                               self.score, self.end_game_score, self.phase, self.pawn_key))
+        self.zobrist_history.append(self.zobrist_key)
+        if self.en_passant_square is not None:
+            self.zobrist_key ^= self.en_passant_key()  # hash out the old en-passant square
+
+        if captured != "  ":
+            # en-passant captures take the pawn beside the destination square
+            self.remove_piece(captured, (start & 56 | end & 7) if flag == EN_PASSANT_FLAG else end)
+
+        if piece[0] == "p" and (end < 8 or end >= 56):
+            # handles pawn promotion (defaults to a queen)
+            self.remove_piece(piece, start)
+            self.put_piece((move.promotion or "q") + colour, end)
+        else:
+            bits = 1 << start | 1 << end
+            self.bitboards[piece] ^= bits
+            self.occupancy[colour] ^= bits
+            squares = self.piece_squares[piece]
+            squares.discard(start)
+            squares.add(end)
+            board = self.board
+            board[start >> 3][start & 7] = "  "
+            board[end >> 3][end & 7] = piece
+            values = PIECE_SQUARE_VALUES[piece]
+            self.score += values[end] - values[start]
+            values = END_GAME_PIECE_SQUARE_VALUES[piece]
+            self.end_game_score += values[end] - values[start]
+            keys = ZOBRIST_PIECES[piece]
+            self.zobrist_key ^= keys[start] ^ keys[end]
+            if piece[0] == "p":
+                self.pawn_key ^= keys[start] ^ keys[end]
+
+            # handles castling moves (king moving two squares)
+            if flag == CASTLING_FLAG:
+                rook_col, rook_end_col = (0, 3) if end & 7 == 2 else (7, 5)
+                self.remove_piece("r" + colour, (start & 56) + rook_col)
+                self.put_piece("r" + colour, (start & 56) + rook_end_col)
+
+        # moving the king or a rook, or capturing a rook, loses castling rights
+        if self.castling_rights and (start in CASTLING_SQUARES or end in CASTLING_SQUARES):
+            rights = self.castling_rights & ~(CASTLING_SQUARES.get(start, 0) | CASTLING_SQUARES.get(end, 0))
+            self.zobrist_key ^= ZOBRIST_CASTLING[self.castling_rights] ^ ZOBRIST_CASTLING[rights]
+            self.castling_rights = rights
+
+        # flag square skipped by a double pawn advance for en-passant, and the fifty-move rule counter
+        if piece[0] == "p":
+            self.en_passant_square = (start + end) >> 1 if end - start == 16 or start - end == 16 else None
+            self.halfmove_clock = 0
+        else:
+            self.en_passant_square = None
+            self.halfmove_clock = 0 if captured != "  " else self.halfmove_clock + 1
 
-            # dark rooks
-            elif move.start_row == 0 and move.start_col == 0:
-                self.dark_queen_side_castle = False
-            elif move.start_row == 0 and move.start_col == 7:
-                self.dark_king_side_castle = False
+        self.move_log.append(move)  # log move
+        self.light_to_move = not self.light_to_move  # next player to move
+        self.zobrist_key ^= ZOBRIST_DARK_TO_MOVE
+        if self.en_passant_square is not None:
+            self.zobrist_key ^= self.en_passant_key()
 
     def undo_move(self, look_ahead_mode=False):
         """
-                undoes last move
+                undoes last move (restoring the irreversible state, scores and keys saved by
+                make_move, so the cost does not depend on the length of the game and only the
+                pieces have to be moved back)
 
                 input parameter(s):
-                look_ahead_mode   -->  flag for thinking mode vs playing mode (false = playing mode)
+                look_ahead_mode   -->  True for moves taken back by a search (silently), False
+                                       prints the move taken back. Default is False
 
                 return parameter(s):
                 None
         """
         if self.move_log:
             last_move = self.move_log.pop()
-            self.board[last_move.start_row][last_move.start_col] = last_move.piece_moved
-            self.board[last_move.end_row][last_move.end_col] = last_move.piece_captured
-
-            # handles enpassant
+            (self.castling_rights, self.en_passant_square, captured, self.halfmove_clock,
+             self.score, self.end_game_score, self.phase, self.pawn_key) = self.state_log.pop()
+            self.zobrist_key = self.zobrist_history.pop()  # recall hash of the previous position
             self.light_to_move = not self.light_to_move
 
-            if not look_ahead_mode:
-                self.en_passant = []
-            if last_move.en_passant_captured:
-                self.en_passant.append(Move((last_move.start_row, last_move.start_col), (
-                    last_move.end_row, last_move.end_col), self.board))  # recall en-passant valid move
-
-                if self.light_to_move:
-                    self.board[last_move.end_row +
-                               1][last_move.end_col] = last_move.en_passant_captured
+            move_id = last_move.move_id
+            start = move_id & 63
+            end = move_id >> 6 & 63
+            piece = last_move.piece_moved
+            colour = piece[1]
+            board = self.board
+
+            # the piece on the destination square differs from the piece moved after promotions
+            promoted = board[end >> 3][end & 7]
+            if promoted != piece:
+                self.lift_piece(promoted, end)
+                self.place_piece(piece, start)
+            else:
+                bits = 1 << start | 1 << end
+                self.bitboards[piece] ^= bits
+                self.occupancy[colour] ^= bits
+                squares = self.piece_squares[piece]
+                squares.discard(end)
+                squares.add(start)
+                board[end >> 3][end & 7] = "  "
+                board[start >> 3][start & 7] = piece
+
+            if captured != "  ":
+                # handles enpassant
+                if move_id & MOVE_FLAGS == EN_PASSANT_FLAG:
+                    self.place_piece(captured, start & 56 | end & 7)
                 else:
-                    self.board[last_move.end_row -
-                               1][last_move.end_col] = last_move.en_passant_captured
-
-            # handles checkmate and stalemate
-            self.check_mate = False if self.check_mate else False
-            self.stale_mate = False if self.stale_mate else False
-
-            # update king's position
-            if last_move.piece_moved == "kl":
-                self.light_king_location = (
-                    last_move.start_row, last_move.start_col)
-
-                # undoing first-time non-castling light king move (for castling)
-                if last_move.start_row == 7 and last_move.start_col == 4 and not last_move.castling_rook:
-
-                    # ensure no king moves in past moves (first time king move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row) and \
-                                (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-                    if count == 0:
-                        self.light_queen_side_castle = True
-                        self.light_king_side_castle = True
-
-            elif last_move.piece_moved == "kd":
-                self.dark_king_location = (
-                    last_move.start_row, last_move.start_col)
-
-                # undoing first-time non-castling dark king move (for castling)
-                if last_move.start_row == 0 and last_move.start_col == 4 and not last_move.castling_rook:
-
-                    # ensure no king moves in past moves (first time king move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row) and \
-                                (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-                    if count == 0:
-                        self.dark_queen_side_castle = True
-                        self.dark_king_side_castle = True
+                    self.place_piece(captured, end)
 
             # handles castling
-            if last_move.castling_rook:
-                if last_move.piece_moved == "kl" and last_move.end_col == 2:
-                    self.light_queen_side_castle = True
-                    self.board[7][3] = "  "
-                    self.board[7][0] = "rl"
-                elif last_move.piece_moved == "kl" and last_move.end_col == 6:
-                    self.light_king_side_castle = True
-                    self.board[7][5] = "  "
-                    self.board[7][7] = "rl"
-                elif last_move.piece_moved == "kd" and last_move.end_col == 2:
-                    self.dark_queen_side_castle = True
-                    self.board[0][3] = "  "
-                    self.board[0][0] = "rd"
-                elif last_move.piece_moved == "kd" and last_move.end_col == 6:
-                    self.dark_king_side_castle = True
-                    self.board[0][5] = "  "
-                    self.board[0][7] = "rd"
-
-            # undoing first-time rook moves (for castling)
-            # light king side rook
-            if last_move.piece_moved == "rl":
-                if last_move.start_row == 7 and last_move.start_col == 7:
-
-                    # ensure no rook moves in past moves (first time rook move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row)\
-                                and (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-
-                    if count == 0:
-                        self.light_king_side_castle = True
-
-                # light queen side rook
-                elif last_move.start_row == 7 and last_move.start_col == 0:
-
-                    # ensure no rook moves in past moves (first time rook move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row)\
-                                and (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-
-                    if count == 0:
-                        self.light_queen_side_castle = True
-
-            # dark king side rook
-            elif last_move.piece_moved == "rd":
-                if last_move.start_row == 0 and last_move.start_col == 7:
-
-                    # ensure no rook moves in past moves (first time rook move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row)\
-                                and (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-
-                    if count == 0:
-                        self.dark_king_side_castle = True
-
-                # dark queen side rook
-                elif last_move.start_row == 0 and last_move.start_col == 0:
-
-                    # ensure no rook moves in past moves (first time rook move!)
-                    count = 0
-                    for past_move in self.move_log:
-                        if (past_move.piece_moved == last_move.piece_moved) and (past_move.start_row == last_move.start_row)\
-                                and (past_move.start_col == last_move.start_col):
-                            count += 1
-                            break
-
-                    if count == 0:
-                        self.dark_queen_side_castle = True
+            elif move_id & MOVE_FLAGS == CASTLING_FLAG:
+                rook_col, rook_end_col = (0, 3) if end & 7 == 2 else (7, 5)
+                self.lift_piece("r" + colour, (start & 56) + rook_end_col)
+                self.place_piece("r" + colour, (start & 56) + rook_col)
+
+            # handles checkmate and stalemate
+            self.check_mate = False
+            self.stale_mate = False
 
             # interactive
             if not look_ahead_mode:
                 print("Reversing", last_move.get_chess_notation())
 
-            #last_move.piece_captured = "  "
-
         else:
             print("All undone!")
 
+    def make_null_move(self):
+        """
+                passes the turn without moving a piece (null move pruning in the AI search). The
+                null move is logged as None and must be taken back with undo_null_move
+
+                input parameter(s):
+                None
+
+                return parameter(s):
+                None
+        """
+        self.state_log.append((self.castling_rights, self.en_passant_square, "  ", self.halfmove_clock,
+                               self.score, self.end_game_score, self.phase, self.pawn_key))
+        self.zobrist_history.append(self.zobrist_key)
+        self.zobrist_key ^= self.en_passant_key() ^ ZOBRIST_DARK_TO_MOVE
+        self.en_passant_square = None
+        self.halfmove_clock += 1
+        self.move_log.append(None)
+        self.light_to_move = not self.light_to_move
+
+    def undo_null_move(self):
+        """
+                takes back a null move made by make_null_move
+
+                input parameter(s):
+                None
+
+                return parameter(s):
+                None
+        """
+        self.move_log.pop()
+        state = self.state_log.pop()  # a null move captures nothing and leaves the score as it was
+        self.castling_rights, self.en_passant_square, self.halfmove_clock = state[0], state[1], state[3]
+        self.light_to_move = not self.light_to_move
+        self.zobrist_key = self.zobrist_history.pop()
+
+    def has_pieces(self, colour):
+        """
+                determines if a colour has pieces other than its king and pawns (without them
+                passing the turn could be its best option, so null moves are not tried)
+
+                input parameter(s):
+                colour --> 'l' for light or 'd' for dark
+
+                return parameter(s):
+                bool of True or False
+        """
+        return self.occupancy[colour] != self.bitboards["p" + colour] | self.bitboards["k" + colour]
+
     def get_valid_moves(self):
         """
-                gives the valid piece moves on the board while considering potential checks
+                gives the valid piece moves on the board while considering potential checks.
+                The checking and pinned pieces are found once, so only legal moves are generated:
+                pinned pieces only move along their pin, the king only moves to safe squares and
+                in check only captures of the checking piece and blocks of its line are generated
 
                 input parameter(s):
                 None
@@ -539,18 +1086,40 @@ class Game_state():
                 moves --> list of vlid move objects
                 turn  --> char of current player turn ('l' for light, 'd' for dark)
         """
+        turn, opp_turn = ("l", "d") if self.light_to_move else ("d", "l")
+        king_r, king_c = self.light_king_location if self.light_to_move else self.dark_king_location
+        king_sq = king_r * 8 + king_c
+        own = self.occupancy[turn]
+        occupied = own | self.occupancy[opp_turn]
+        moves = []
 
-        moves, turn = self.get_possible_moves()
-        for move in moves[::-1]:  # reverse iteration
-            self.make_move(move, True)
-            self.light_to_move = not self.light_to_move
-            if self.is_in_check():
-                moves.remove(move)
-            self.undo_move(True)
-            self.light_to_move = not self.light_to_move
+        # squares attacked by the opponent once the king has left its square (so the king
+        # cannot step back along the line of a checking slider)
+        attacked = self.attacked_squares(opp_turn, occupied ^ (1 << king_sq))
+        checkers = self.attackers_to(king_sq, opp_turn, occupied) if (attacked >> king_sq) & 1 else 0
+
+        # king moves to squares that are not attacked
+        self.append_moves(king_r, king_c, KING_ATTACKS[king_sq] & ~own & ~attacked, moves)
+
+        if not checkers & (checkers - 1):  # only the king can move out of double check
+            if checkers:  # check evasion (capture the checking piece or block its line)
+                allowed = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+            else:
+                allowed = FULL_BOARD
+                self.get_castling_moves(king_r, king_c, moves, attacked)
+
+            pins = self.get_pins(king_sq, turn, opp_turn, occupied)
+            for piece in (LIGHT_PIECES[:5] if self.light_to_move else DARK_PIECES[:5]):
+                for sq in self.piece_squares[piece]:
+                    self.move_piece[piece[0]](sq >> 3, sq & 7, moves, pins.get(sq, FULL_BOARD) & allowed)
+
+            # an en-passant capture removes two pawns from a rank (possibly exposing the king)
+            # so it is the one move still tested by making it
+            if self.en_passant_square is not None:
+                moves = [move for move in moves if not self.is_en_passant(move) or self.is_legal(move)]
 
         if len(moves) == 0:
-            if self.is_in_check():
+            if checkers:
                 self.check_mate = True
             else:
                 self.stale_mate = True
@@ -562,6 +1131,296 @@ class Game_state():
 
         return moves, turn
 
+    def generate_moves(self, hash_move_id=None, killers=(), history=None, captures_only=False):
+        """
+                yields the valid moves in stages: the hash move, captures (including en-passant
+                and capturing promotions), the remaining promotions and finally the quiet moves.
+                A stage is only generated once the search asks for a move past the previous one,
+                so a search that cuts off early never pays for the later stages. Unlike
+                get_valid_moves, check_mate and stale_mate are not updated.
+                Captures are sorted by most valuable victim / least valuable attacker and quiet
+                moves put the killer moves first, then the rest by their history score
+
+                input parameter(s):
+                hash_move_id --> Move.move_id of the move to try first, eg the best move found
+                                 earlier in this position (int). Default is None
+                killers   --> quiet moves that caused cutoffs in sibling positions (Move objects).
+                              Default is no killers
+                history   --> score of each quiet move indexed by move_id & FROM_TO (list of 4096
+                              ints). Default is None (quiet moves in generation order)
+                captures_only --> stop after the captures and promotions (no quiet moves), eg for
+                                  a quiescence search. Default is False
+
+                return parameter(s):
+                move --> next valid move (Move object)
+        """
+        turn, opp_turn = ("l", "d") if self.light_to_move else ("d", "l")
+        king_r, king_c = self.light_king_location if self.light_to_move else self.dark_king_location
+        king_sq = king_r * 8 + king_c
+        own = self.occupancy[turn]
+        enemy = self.occupancy[opp_turn]
+        occupied = own | enemy
+        en_passant = 0 if self.en_passant_square is None else 1 << self.en_passant_square
+        promotion_rank = 0xFF if self.light_to_move else 0xFF << 56
+
+        attacked = self.attacked_squares(opp_turn, occupied ^ (1 << king_sq))
+        checkers = self.attackers_to(king_sq, opp_turn, occupied) if (attacked >> king_sq) & 1 else 0
+        king_targets = KING_ATTACKS[king_sq] & ~own & ~attacked
+
+        if checkers & (checkers - 1):  # only the king can move out of double check
+            allowed, pins, pieces = 0, {}, ()
+        else:
+            allowed = checkers | BETWEEN[king_sq][checkers.bit_length() - 1] if checkers else FULL_BOARD
+            pins = self.get_pins(king_sq, turn, opp_turn, occupied)
+            pieces = LIGHT_PIECES[:5] if self.light_to_move else DARK_PIECES[:5]
+
+        # hash move (only the moves of the piece on its starting square are generated to verify it)
+        hash_id = None
+        if hash_move_id is not None:
+            moves = []
+            sq = hash_move_id & 63
+            piece = self.board[sq >> 3][sq & 7]
+            if sq == king_sq:
+                self.append_moves(king_r, king_c, king_targets, moves)
+                if not checkers:
+                    self.get_castling_moves(king_r, king_c, moves, attacked)
+            elif piece[1] == turn and pieces:
+                self.move_piece[piece[0]](sq >> 3, sq & 7, moves, pins.get(sq, FULL_BOARD) & allowed)
+
+            for move in moves:
+                if move.move_id == hash_move_id and (not self.is_en_passant(move) or self.is_legal(move)):
+                    hash_id = move.move_id
+                    yield move
+                    break
+
+        # captures
+        moves = []
+        self.append_moves(king_r, king_c, king_targets & enemy, moves)
+        for piece in pieces:
+            targets = allowed & (enemy | en_passant if piece[0] == "p" else enemy)
+            for sq in self.piece_squares[piece]:
+                self.move_piece[piece[0]](sq >> 3, sq & 7, moves, pins.get(sq, FULL_BOARD) & targets)
+
+        moves.sort(key=lambda move: MVV_LVA_VALUES[(move.en_passant_captured or move.piece_captured)[0]] * 8 -
+                   MVV_LVA_VALUES[move.piece_moved[0]], reverse=True)
+        for move in moves:
+            if move.move_id != hash_id and (not en_passant or not self.is_en_passant(move) or self.is_legal(move)):
+                yield move
+
+        # promotions (pawn advances to the last rank)
+        moves = []
+        for sq in (self.piece_squares[pieces[0]] if pieces else ()):
+            self.get_pawn_moves(sq >> 3, sq & 7, moves, pins.get(sq, FULL_BOARD) & allowed & promotion_rank & ~occupied)
+
+        for move in moves:
+            if move.move_id != hash_id:
+                yield move
+
+        if captures_only:
+            return
+
+        # quiet moves
+        moves = []
+        self.append_moves(king_r, king_c, king_targets & ~occupied, moves)
+        if not checkers:
+            self.get_castling_moves(king_r, king_c, moves, attacked)
+        for piece in pieces:
+            targets = allowed & ~occupied & (~en_passant & ~promotion_rank if piece[0] == "p" else FULL_BOARD)
+            for sq in self.piece_squares[piece]:
+                self.move_piece[piece[0]](sq >> 3, sq & 7, moves, pins.get(sq, FULL_BOARD) & targets)
+
+        if killers or history:
+            # killers (in slot order) score above every history score
+            killer_scores = {killer.move_id: (1 << 62) - slot for slot, killer in enumerate(killers) if killer is not None}
+            moves.sort(key=lambda move: killer_scores.get(move.move_id, history[move.move_id & FROM_TO] if history else 0),
+                       reverse=True)
+        for move in moves:
+            if move.move_id != hash_id:
+                yield move
+
+    def get_pins(self, king_sq, turn, opp_turn, occupied):
+        """
+                finds pieces pinned to their king by enemy bishops, rooks and queens
+
+                input parameter(s):
+                king_sq  --> square of the king (int)
+                turn     --> colour of the king ('l' or 'd')
+                opp_turn --> colour of the pinning pieces ('l' or 'd')
+                occupied --> bitboard of all pieces on the board (int)
+
+                return parameter(s):
+                pins --> dictionary of pinned piece squares to the bitboard of squares they
+                         may still move to (between the king and the pinning piece, inclusive)
+        """
+        pins = {}
+        bitboards = self.bitboards
+        queens = bitboards["q" + opp_turn]
+        snipers = (BISHOP_LINES[king_sq] & (bitboards["b" + opp_turn] | queens)) | \
+            (ROOK_LINES[king_sq] & (bitboards["r" + opp_turn] | queens))
+
+        while snipers:
+            bit = snipers & -snipers
+            between = BETWEEN[king_sq][bit.bit_length() - 1]
+            blockers = between & occupied
+            # a single friendly piece between king and sniper is pinned
+            if blockers and not blockers & (blockers - 1) and blockers & self.occupancy[turn]:
+                pins[blockers.bit_length() - 1] = between | bit
+            snipers ^= bit
+
+        return pins
+
+    def is_en_passant(self, move):
+        """
+                determines if a move is an en-passant capture (diagonal pawn move onto an empty square)
+
+                input parameter(s):
+                move --> move to be tested (Move object)
+
+                return parameter(s):
+                bool of True or False
+        """
+        return move.move_id & MOVE_FLAGS == EN_PASSANT_FLAG
+
+    def is_legal(self, move):
+        """
+                determines if a move leaves the mover's king safe by making it
+
+                input parameter(s):
+                move --> move to be tested (Move object)
+
+                return parameter(s):
+                bool of True or False
+        """
+        self.make_move(move, True)
+        self.light_to_move = not self.light_to_move
+        legal = not self.is_in_check()
+        self.light_to_move = not self.light_to_move
+        self.undo_move(True)
+        return legal
+
+    def perft(self, depth):
+        """
+                counts the leaf nodes of the legal move tree (performance test). The counts
+                of well known positions verify the move generator and time its speed
+
+                input parameter(s):
+                depth --> number of plies to search (int)
+
+                return parameter(s):
+                nodes --> number of positions reached at the given depth (int)
+        """
+        if depth == 0:
+            return 1
+
+        moves = self.get_valid_moves()[0]
+        if depth == 1:  # bulk count the last ply
+            return len(moves)
+
+        nodes = 0
+        for move in moves:
+            self.make_move(move, True)
+            nodes += self.perft(depth - 1)
+            self.undo_move(True)
+
+        return nodes
+
+    def divide(self, depth):
+        """
+                perft split by root move (to locate move generation bugs)
+
+                input parameter(s):
+                depth --> number of plies to search (int)
+
+                return parameter(s):
+                counts --> dictionary of root moves in coordinate notation (eg "e2e4") to
+                           their perft count at depth - 1
+        """
+        counts = {}
+        for move in self.get_valid_moves()[0]:
+            self.make_move(move, True)
+            counts[move.get_coordinate_notation()] = self.perft(depth - 1)
+            self.undo_move(True)
+
+        return counts
+
+    def load_fen(self, fen):
+        """
+                sets up the position from a FEN string
+
+                input parameter(s):
+                fen --> position in Forsyth-Edwards Notation (str)
+
+                return parameter(s):
+                None
+        """
+        fields = fen.split()
+        self.board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["  "] * int(char))
+                else:
+                    row.append(char.lower() + ("l" if char.isupper() else "d"))
+            self.board.append(row)
+
+        self.light_to_move = fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.castling_rights = (LIGHT_KING_SIDE if "K" in castling else 0) | \
+            (LIGHT_QUEEN_SIDE if "Q" in castling else 0) | \
+            (DARK_KING_SIDE if "k" in castling else 0) | \
+            (DARK_QUEEN_SIDE if "q" in castling else 0)
+
+        en_passant = fields[3] if len(fields) > 3 else "-"
+        self.en_passant_square = None if en_passant == "-" else \
+            Move.ranks_to_rows[en_passant[1]] * 8 + Move.files_to_cols[en_passant[0]]
+
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.start_ply = 2 * (fullmove - 1) + (0 if self.light_to_move else 1)
+
+        self.move_log = []
+        self.state_log = []
+        self.zobrist_history = []
+        self.check_mate = False
+        self.stale_mate = False
+        self.refresh_bitboards()
+        self.compute_zobrist_key()
+
+    def get_fen(self):
+        """
+                describes the position as a FEN string (the inverse of load_fen), eg to send it
+                to another process. The fullmove number counts the moves in self.move_log on
+                from the fullmove number of the loaded FEN
+
+                input parameter(s):
+                None
+
+                return parameter(s):
+                fen --> position in Forsyth-Edwards Notation (str)
+        """
+        ranks = []
+        for row in self.board:
+            rank, empty = "", 0
+            for piece in row:
+                if piece == "  ":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[0].upper() if piece[1] == "l" else piece[0]
+            ranks.append(rank + (str(empty) if empty else ""))
+
+        castling = "".join(flag for right, flag in ((LIGHT_KING_SIDE, "K"), (LIGHT_QUEEN_SIDE, "Q"),
+                                                    (DARK_KING_SIDE, "k"), (DARK_QUEEN_SIDE, "q"))
+                           if self.castling_rights & right) or "-"
+        en_passant = "-" if self.en_passant_square is None else \
+            Move.cols_to_files[self.en_passant_square & 7] + Move.rows_to_ranks[self.en_passant_square >> 3]
+
+        return " ".join(("/".join(ranks), "w" if self.light_to_move else "b", castling, en_passant,
+                         str(self.halfmove_clock), str((self.start_ply + len(self.move_log)) // 2 + 1)))
+
     def get_possible_moves(self):
         """
                 gives naive possible moves of pieces on the board without taking checks into 
@@ -576,16 +1435,11 @@ class Game_state():
         """
 
         moves = []
-        # if self.en_passant:
-        for obj in self.en_passant:
-            moves.append(obj)
-
         turn = "l" if self.light_to_move else "d"
 
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                if self.board[i][j][1] == turn:
-                    self.move_piece[self.board[i][j][0]](i, j, moves)
+        for piece in (LIGHT_PIECES if self.light_to_move else DARK_PIECES):
+            for sq in self.piece_squares[piece]:
+                self.move_piece[piece[0]](sq >> 3, sq & 7, moves)
 
         return moves, turn
 
@@ -604,6 +1458,118 @@ class Game_state():
         else:
             return self.is_square_attacked(self.dark_king_location[0], self.dark_king_location[1])
 
+    def attacked_squares(self, colour, occupied):
+        """
+                finds all squares attacked by the pieces of a colour
+
+                input parameter(s):
+                colour   --> colour of the attacking pieces ('l' or 'd')
+                occupied --> bitboard of pieces blocking sliding attacks (int)
+
+                return parameter(s):
+                bitboard of attacked squares (int)
+        """
+        bitboards = self.bitboards
+        # pawns and knights attack set-wise, the single king by table
+        attacked = pawn_attacks(bitboards["p" + colour], colour) | knight_attacks(bitboards["n" + colour])
+        king = bitboards["k" + colour]
+        if king:
+            attacked |= KING_ATTACKS[king.bit_length() - 1]
+
+        queens = bitboards["q" + colour]
+        pieces = bitboards["b" + colour] | queens
+        while pieces:
+            bit = pieces & -pieces
+            attacked |= bishop_attacks(bit.bit_length() - 1, occupied)
+            pieces ^= bit
+
+        pieces = bitboards["r" + colour] | queens
+        while pieces:
+            bit = pieces & -pieces
+            attacked |= rook_attacks(bit.bit_length() - 1, occupied)
+            pieces ^= bit
+
+        return attacked
+
+    def attackers_to(self, sq, colour, occupied):
+        """
+                finds the pieces of a colour attacking a square
+
+                input parameter(s):
+                sq       --> square index, row * 8 + column (int)
+                colour   --> colour of the attacking pieces ('l' or 'd')
+                occupied --> bitboard of pieces blocking sliding attacks (int)
+
+                return parameter(s):
+                bitboard of attacking pieces (int)
+        """
+        bitboards = self.bitboards
+        attackers = (KNIGHT_ATTACKS[sq] & bitboards["n" + colour]) | \
+            (PAWN_ATTACKS["d" if colour == "l" else "l"][sq] & bitboards["p" + colour]) | \
+            (KING_ATTACKS[sq] & bitboards["k" + colour])
+
+        queens = bitboards["q" + colour]
+        sliders = BISHOP_LINES[sq] & (bitboards["b" + colour] | queens)
+        if sliders:
+            attackers |= bishop_attacks(sq, occupied) & sliders
+        sliders = ROOK_LINES[sq] & (bitboards["r" + colour] | queens)
+        if sliders:
+            attackers |= rook_attacks(sq, occupied) & sliders
+
+        return attackers
+
+    def see(self, move):
+        """
+                static exchange evaluation: the material the side to move wins (or loses when
+                negative) if both sides keep recapturing on the destination square of a move with
+                their least valuable piece, stopping whenever recapturing would lose material.
+                Pieces behind the capturing ones (eg a rook behind a queen) join in as the square
+                is cleared. No moves are made
+
+                input parameter(s):
+                move --> move to be evaluated (Move object)
+
+                return parameter(s):
+                gain --> material won by the exchange (int)
+        """
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        occupied = (self.occupancy["l"] | self.occupancy["d"]) ^ (1 << start)
+        if move.en_passant_captured:
+            occupied ^= 1 << (move.start_row * 8 + move.end_col)
+
+        # gains[i] = material won by the side making capture i if the exchange stopped there
+        gains = [abs(piece_values[move.en_passant_captured or move.piece_captured])]
+        on_square = abs(piece_values[move.piece_moved])  # value of the piece standing on the square
+        if move.promotion:
+            on_square = abs(piece_values[move.promotion + "l"])
+            gains[0] += on_square - piece_values["pl"]
+
+        colour = "d" if move.piece_moved[1] == "l" else "l"
+        while True:
+            attackers = self.attackers_to(end, colour, occupied) & occupied
+            if not attackers:
+                break
+
+            # least valuable attacker
+            for piece_type in "pnbrqk":
+                bits = attackers & self.bitboards[piece_type + colour]
+                if bits:
+                    break
+            if piece_type == "k" and self.attackers_to(end, "d" if colour == "l" else "l", occupied) & occupied:
+                break  # the king cannot recapture onto a defended square
+
+            gains.append(on_square - gains[-1])
+            on_square = abs(piece_values[piece_type + colour])
+            occupied ^= bits & -bits
+            colour = "d" if colour == "l" else "l"
+
+        # either side may stop recapturing, so each capture is only made if it does not lose
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+
     def is_square_attacked(self, r, c):
         """
                 determines if enemy can attack given board position
@@ -615,70 +1581,28 @@ class Game_state():
                 return parameter(s):
                 bool of True or False
         """
-
-        turn = 'l' if self.light_to_move else "d"  # allies turn
+        sq = r * 8 + c
+        turn = "l" if self.light_to_move else "d"  # allies turn
         opp_turn = "d" if self.light_to_move else "l"  # opponents turn
-
-        # check for all possible knight attacks
-        checks = ((1, 2), (-1, 2), (1, -2), (-1, -2),
-                  (2, 1), (2, -1), (-2, -1), (-2, 1))
-        for loc in checks:
-            end_row = r + loc[0]
-            end_col = c + loc[1]
-
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if self.board[end_row][end_col][1] == opp_turn and self.board[end_row][end_col][0] == "n":
-                    return True
-
-        # check for all possible pawn attacks
-        checks = ((-1, -1), (-1, 1)) if self.light_to_move else ((1, -1), (1, 1))
-        for loc in checks:
-            end_row = r + loc[0]
-            end_col = c + loc[1]
-
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if self.board[end_row][end_col][1] == opp_turn and self.board[end_row][end_col][0] == "p":
-                    return True
-
-        # check for all possible bishop or queen or king attacks
-        checks = ((1, -1), (1, 1), (-1, -1), (-1, 1))
-        for loc in checks:
-            for i in range(1, 8):
-                end_row = loc[0]*i + r
-                end_col = loc[1]*i + c
-
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if self.board[end_row][end_col][1] == turn:
-                        break
-
-                    elif (i == 1) and (self.board[end_row][end_col][1] == opp_turn) and (self.board[end_row][end_col][0] == "k"):
-                        return True
-
-                    elif self.board[end_row][end_col][1] == opp_turn:
-                        if self.board[end_row][end_col][0] == "b" or self.board[end_row][end_col][0] == "q":
-                            return True
-                        else:
-                            break
-
-        # check for all possible rook or queen or king attacks
-        checks = ((1, 0), (-1, 0), (0, 1), (0, -1))
-        for loc in checks:
-            for i in range(1, 8):
-                end_row = loc[0]*i + r
-                end_col = loc[1]*i + c
-
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if self.board[end_row][end_col][1] == turn:
-                        break
-
-                    elif (i == 1) and (self.board[end_row][end_col][1] == opp_turn) and (self.board[end_row][end_col][0] == "k"):
-                        return True
-
-                    elif (self.board[end_row][end_col][1] == opp_turn):
-                        if self.board[end_row][end_col][0] == "r" or self.board[end_row][end_col][0] == "q":
-                            return True
-                        else:
-                            break
+        bitboards = self.bitboards
+
+        # knight, pawn and king attacks (a pawn of ours on the square would attack enemy pawns)
+        if KNIGHT_ATTACKS[sq] & bitboards["n" + opp_turn]:
+            return True
+        if PAWN_ATTACKS[turn][sq] & bitboards["p" + opp_turn]:
+            return True
+        if KING_ATTACKS[sq] & bitboards["k" + opp_turn]:
+            return True
+
+        # bishop or queen and rook or queen attacks (only traced when one shares a line with the square)
+        occupied = self.occupancy["l"] | self.occupancy["d"]
+        queens = bitboards["q" + opp_turn]
+        sliders = BISHOP_LINES[sq] & (bitboards["b" + opp_turn] | queens)
+        if sliders and bishop_attacks(sq, occupied) & sliders:
+            return True
+        sliders = ROOK_LINES[sq] & (bitboards["r" + opp_turn] | queens)
+        if sliders and rook_attacks(sq, occupied) & sliders:
+            return True
 
         return False
 
@@ -699,7 +1623,11 @@ class Move():
     # map columns to files (revers of files to columns)
     cols_to_files = {col: file for file, col in files_to_cols.items()}
 
-    def __init__(self, start_sq, end_sq, board):
+    # fixed attributes (no per-move __dict__) as the search creates a Move for every generated move
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "en_passant_captured", "castling_rook", "promotion", "move_id")
+
+    def __init__(self, start_sq, end_sq, board, promotion=None):
         """
                 A Move class abstracting all parameters needed
                 for moving chess pieces on the board
@@ -708,19 +1636,35 @@ class Move():
                 start_sq --> (row, column) of piece to be moved (tuple)
                 end_square --> (row, column) of move destination on the board (tuple)
                 board --> board object referencing current state of the board (class Game_state) 
+                promotion --> piece type a pawn promotes to ("q", "r", "b" or "n"). Default is None
         """
-        self.start_row = start_sq[0]  # row location of piece to be moved
-        self.start_col = start_sq[1]  # column location of piece to be moved
+        start_row, start_col = start_sq
+        end_row, end_col = end_sq
+        self.start_row = start_row  # row location of piece to be moved
+        self.start_col = start_col  # column location of piece to be moved
         # intended row destination of piece to be moved
-        self.end_row = end_sq[0]
+        self.end_row = end_row
         # intended column destiantion of piece to e moved
-        self.end_col = end_sq[1]
+        self.end_col = end_col
         # actual piece moved
-        self.piece_moved = board[self.start_row][self.start_col]
+        self.piece_moved = piece_moved = board[start_row][start_col]
         # opponent piece if any on the destination square
-        self.piece_captured = board[self.end_row][self.end_col]
+        self.piece_captured = board[end_row][end_col]
         self.en_passant_captured = None  # piece captured during en-passant
         self.castling_rook = None  # rook castled during castling
+        self.promotion = promotion  # piece type chosen for pawn promotion
+        # 16 bit move encoding (start square, end square, promotion piece and kind of move)
+        self.move_id = start_row * 8 + start_col | (end_row * 8 + end_col) << 6
+
+        if promotion:
+            self.move_id |= PROMOTION_FLAG | PROMOTION_CODES[promotion]
+        elif piece_moved[0] == "p":
+            if start_col != end_col and self.piece_captured == "  ":  # diagonal onto an empty square
+                self.move_id |= EN_PASSANT_FLAG
+                self.en_passant_captured = board[start_row][end_col]
+        elif piece_moved[0] == "k" and (end_col - start_col == 2 or start_col - end_col == 2):
+            self.move_id |= CASTLING_FLAG
+            self.castling_rook = (start_row, 0 if end_col == 2 else 7)
 
     def get_chess_notation(self):
         """
@@ -753,6 +1697,19 @@ class Move():
         # 	"(" + self.piece_captured[0].upper() + " captured!)" if self.piece_captured != "  " else self.piece_moved[0].upper() + "(" + self.get_rank_file(self.start_row, self.start_col) + ") to " + \
         # 	self.get_rank_file(self.end_row, self.end_col)
 
+    def get_coordinate_notation(self):
+        """
+                start and end squares of the move with the promotion piece if any (eg "e7e8q")
+
+                input parameter(s):
+                None
+
+                return parameter(s)
+                notation (string)
+        """
+        return self.get_rank_file(self.start_row, self.start_col) + \
+            self.get_rank_file(self.end_row, self.end_col) + (self.promotion or "")
+
     def get_rank_file(self, r, c):
         """
                 calls cols_to_file and rows_to_rank attributes
@@ -773,11 +1730,16 @@ class Move():
 
         # if first (self) and second (other) parameters are both Move objects
         if isinstance(other, Move):
-            return self.start_row == other.start_row and self.start_col == other.start_col and \
-                self.end_row == other.end_row and self.end_col == other.end_col
+            return self.move_id == other.move_id
         else:
             return False
 
+    def __hash__(self):
+        """
+                moves hash by their 16 bit encoding (usable as dictionary keys)
+        """
+        return self.move_id
+
     def __ne__(self, other):
         """
                 "not equals to" --> conventional counterpart to __eq__
@@ -0,0 +1,66 @@
+# This is the base of the fixed size tables of the AI (transposition and pawn hash tables in
+# ai.py, proof table in mate.py). It has no dependencies, so every module can import it
+# without loading the others
+
+class Hash_table():
+
+    # approximate memory held by one entry in bytes (set by each kind of table)
+    ENTRY_SIZE = 100
+
+    def __init__(self, size_mb):
+        """
+            fixed size table of positions within a memory budget: the slots, sizing, clearing
+            and statistics shared by the transposition and pawn hash tables (ai.py) and the
+            proof table (mate.py). Each kind of table adds its own probe and store, with its
+            own entries and replacement scheme, and counts hits, misses and replacements
+
+            input parameter(s):
+            size_mb --> memory budget of the table in megabytes
+
+            return parameter(s):
+            None
+        """
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """
+            changes the memory budget of the table (clears it)
+
+            input parameter(s):
+            size_mb --> memory budget of the table in megabytes
+
+            return parameter(s):
+            None
+        """
+        self.size = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+        self.clear()
+
+    def clear(self):
+        """
+            removes all entries and resets the statistics
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        self.entries = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+        self.replacements = 0  # entries of another position overwritten
+
+    def stats(self):
+        """
+            usage statistics of the table
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            stats --> dictionary of hits, misses, hit_rate, replacements, used entries and size
+        """
+        probes = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / probes if probes else 0.0,
+                "replacements": self.replacements, "used": self.size - self.entries.count(None),
+                "size": self.size}
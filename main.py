@@ -2,7 +2,7 @@
 # handling user inputs
 
 import pygame as pg
-from ai import ai_move, ai_reset
+from ai import start_ai_move, play_ai_move, cancel_ai_move, start_ponder, ponder_hit, close_search_pool
 from engine import Game_state, Move
 import random
 import sys
@@ -29,7 +29,7 @@ FLIP = sys.argv[1] if len(sys.argv) == 2 else False
 playback_log = []
 
 
-def main(choice=False):
+def main(choice=False, human_side=None):
 	screen = pg.display.set_mode((WIDTH + BORDER, HEIGHT + BORDER))
 	clock = pg.time.Clock()
 	#screen.fill(pg.Color("ghostwhite"))
@@ -39,6 +39,7 @@ def main(choice=False):
 	gs = Game_state()
 	load_images()
 	gs.light_to_move = not gs.light_to_move if FLIP else True 
+	gs.compute_zobrist_key() # rehash after changing the side to move
 	running = True
 
 	square_selected = () # x, y coordinate of selected square
@@ -48,25 +49,41 @@ def main(choice=False):
 	user_prompt = False # pauses gui rendering for user input
 	AI_MODE = choice # flag for activating AI mode
 	delay = 0 # delay the speed of AI plays
+	ai_search = None # AI search running in the background (polled every frame)
+	HUMAN_SIDE = human_side # "l" or "d" when a human plays against the AI
+	ponder_move = None # human move the AI expects (and searches its reply to)
 	display_time = 0 # AI_MODE text display persistence timer
 	PLAYBACK_MODE=False
 	playback_index=0
 
 	while running:
 
+		# AI plays both sides in AI mode, the side the human is not playing otherwise
+		ai_turn = AI_MODE or (HUMAN_SIDE is not None and gs.light_to_move != (HUMAN_SIDE == "l"))
+
 		if not user_prompt:
 			found = False
 
-			if AI_MODE and display_time == 0 and not game_over:
+			if ai_turn and display_time == 0 and not game_over:
 
 				# pause a bit between AI plays if delay > 0
 				if delay == 0:
-					move, gs = ai_move(gs)
+					if ai_search is None:
+						ai_search = start_ai_move(gs)
+
+					elif ai_search.done(): # search finished, make its move
+						move, gs = play_ai_move(gs, ai_search.result()[0])
+						ai_search = None
+
+						if move: # if AI made a move
+							animate(move, screen, gs.board, clock)
+							print(move.get_chess_notation())
 
-					if move: # if AI made a move
-						animate(move, screen, gs.board, clock)
-						print(move.get_chess_notation())
-					delay = 20 # pause magnitude
+						if AI_MODE:
+							delay = 20 # pause magnitude
+						elif move: # human's turn, think about the reply to the expected move
+							valid_moves, first_click_turn = gs.get_valid_moves()
+							ponder_move, ai_search = start_ponder(gs)
 				else:
 					delay -= 1
 
@@ -75,11 +92,15 @@ def main(choice=False):
 					running = False
 
 				elif e.type == pg.KEYDOWN:
-					if e.key == pg.K_u and not AI_MODE and not PLAYBACK_MODE: # u key pressed (undo last move)
+					if e.key == pg.K_u and not AI_MODE and HUMAN_SIDE is None and not PLAYBACK_MODE: # u key pressed (undo last move)
 						gs.undo_move()
 						valid_moves, first_click_turn = gs.get_valid_moves()
 
-					elif e.key == pg.K_r and not AI_MODE and not PLAYBACK_MODE: # r key pressed (reset game)
+					elif e.key == pg.K_r and not PLAYBACK_MODE: # r key pressed (reset game)
+						if ai_search is not None: # stop the AI search of the old game
+							cancel_ai_move(ai_search)
+							ai_search = None
+							ponder_move = None
 						gs = Game_state()
 						valid_moves, turn = [], None
 						square_selected = ()
@@ -91,7 +112,6 @@ def main(choice=False):
 					# 	#toggle = True
 					# 	display_time = 10
 					# 	AI_MODE = not AI_MODE
-					# 	ai_reset()
 					# 	print("AI MODE ENABLED") if AI_MODE else print("AI MODE DISABLED")
 					elif e.key == pg.K_p and not AI_MODE and game_over:
 						PLAYBACK_MODE = not PLAYBACK_MODE
@@ -127,7 +147,7 @@ def main(choice=False):
 							# print(clicked_sqr)
 							playback_index += 1
 							move = Move(
-								start_sqr, end_sqr, gs.board)
+								start_sqr, end_sqr, gs.board, playback_log[playback_index-1].promotion)
 							gs.make_move(move)
 							animate(move, screen, gs.board, clock)
 							print("Move: "+str((playback_index)))
@@ -151,7 +171,7 @@ def main(choice=False):
 
 				elif e.type == pg.MOUSEBUTTONDOWN:
 
-					if not game_over and not AI_MODE:
+					if not game_over and not ai_turn:
 
 						location = pg.mouse.get_pos() # x, y location of mouse click
 						location_col_transform = location[0] // SQ_SIZE - 1
@@ -170,7 +190,9 @@ def main(choice=False):
 								player_clicks.append(square_selected)
 
 							if len(player_clicks) == 2: # 'from' and 'to' are available
-								move = Move(player_clicks[0], player_clicks[1], gs.board) # create move object
+								# promotion piece is chosen once the move is found valid
+								promoting = gs.board[player_clicks[0][0]][player_clicks[0][1]][0] == "p" and player_clicks[1][0] in (0, 7)
+								move = Move(player_clicks[0], player_clicks[1], gs.board, "q" if promoting else None) # create move object
 
 								for obj in range(len(valid_moves)):
 
@@ -178,10 +200,7 @@ def main(choice=False):
 										move = valid_moves[obj]
 										found = True
 
-										gs.make_move(move)
-
-
-										if (move.end_row == 0 or move.end_row == 7) and (move.piece_moved[0] == "p"):
+										if move.promotion:
 											user_prompt = True
 											choice = ("q", "r", "b", "n")
 											promotion = True
@@ -209,13 +228,22 @@ def main(choice=False):
 												pg.display.update()
 												clock.tick(5)
 
-											gs.board[move.end_row][move.end_col] = piece+ move.piece_moved[1]
+											move = Move((move.start_row, move.start_col), (move.end_row, move.end_col), gs.board, piece)
 											user_prompt = False
 
+										gs.make_move(move)
 										animate(move, screen, gs.board, clock)
 
 										print(move.get_chess_notation())
 
+										if ponder_move is not None:
+											if move == ponder_move: # ponderhit, the AI keeps searching
+												ponder_hit()
+											else: # the AI searched the wrong position
+												cancel_ai_move(ai_search)
+												ai_search = None
+											ponder_move = None
+
 										square_selected = ()
 										player_clicks = []
 										valid_moves, first_click_turn = gs.get_valid_moves()
@@ -239,7 +267,7 @@ def main(choice=False):
 				screen, "AI MODE DISABLED", "Red")
 			display_time -= 1  # countdown for text to disappear
 
-		if AI_MODE and not game_over:
+		if ai_turn and not game_over:
 			if gs.light_to_move:
 				display_Thinking_text(screen, gs, "Thinking....")
 			else:
@@ -262,6 +290,10 @@ def main(choice=False):
 		clock.tick(MAX_FPS)
 		pg.display.flip()
 
+	if ai_search is not None: # window closed mid-search
+		cancel_ai_move(ai_search)
+	close_search_pool() # stop the worker processes of parallel searches (if any)
+
 
 def load_images():
 	pieces = ["bd", "bl", "kd", "kl", "nd",
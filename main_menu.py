@@ -1,18 +1,8 @@
 import pygame as pg
-from ai import ai_move, ai_reset
-from menu import main_menu
+from ai import ai_move
 import random
 import sys
 
-# Game Initialization
-pg.init()
-
-# menu Resolution
-screen_width=600
-screen_height=600
-screen=pg.display.set_mode((screen_width, screen_height))
-font = pg.font.SysFont("Helvetica",75)
-
 def option_format(message, player_size, player_color):
 	"""
 		Add Menu Options
@@ -27,10 +17,8 @@ blue=(0, 0, 255)
 yellow=pg.Color("Peru")
 bg_color=pg.Color("chartreuse")
 red=(255,0,0)
-font = pg.font.SysFont("Liberation", 50)
  
 # Game Framerate
-clock = pg.time.Clock()
 FPS=30
 
 
@@ -143,6 +131,20 @@ def menu():
 		pg.display.set_caption("STEAM CHESS ENGINE")	
 
 #Initialize the Game
-menu()
-pg.quit()
-quit()
\ No newline at end of file
+# (only when run, the worker processes of the AI search import this module again)
+if __name__ == "__main__":
+	from menu import main_menu
+
+	# Game Initialization
+	pg.init()
+
+	# menu Resolution
+	screen_width=600
+	screen_height=600
+	screen=pg.display.set_mode((screen_width, screen_height))
+	font = pg.font.SysFont("Liberation", 50)
+	clock = pg.time.Clock()
+
+	menu()
+	pg.quit()
+	quit()
\ No newline at end of file
@@ -0,0 +1,301 @@
+# This is the mate solver of the AI. It proves (or disproves) that the side to move can force
+# checkmate within a number of moves with a depth-first proof-number search (df-pn): the
+# search always expands the position that is cheapest to prove or disprove, so a forced mate
+# is found without searching every reply to the full depth like minimax does
+#
+# usage:
+#   python mate.py -n 3 --fen "<fen>"    mate in 3 moves or less of a single position
+#   python mate.py -n 2 puzzles.txt      every position of a file (one FEN per line)
+
+import argparse
+import time
+from math import inf
+from engine import Game_state
+from hash_table import Hash_table
+
+# default size of the proof table in megabytes
+MATE_TABLE_MB = 32
+
+# proof and disproof numbers of a solved position (the side to move has won or lost)
+PROOF_INFINITY = 1 << 30
+
+
+class Proof_table(Hash_table):
+
+    # approximate memory held by one entry (list slot, entry tuple and its numbers) in bytes,
+    # measured with sys.getsizeof
+    ENTRY_SIZE = 208
+
+    def __init__(self, size_mb=MATE_TABLE_MB):
+        """
+            fixed size table of the proof and disproof numbers of searched positions, indexed
+            by their zobrist key and the number of plies left to mate. Each entry is a tuple of
+            (zobrist_key, plies, phi, delta, work). When two positions share a slot the one that
+            took more work (searched nodes) to reach is kept, so the table never grows past
+            its memory budget
+
+            input parameter(s):
+            size_mb --> memory budget of the table in megabytes. Default is MATE_TABLE_MB
+
+            return parameter(s):
+            None
+        """
+        super().__init__(size_mb)
+
+    def probe(self, key, plies):
+        """
+            looks up a position
+
+            input parameter(s):
+            key   --> zobrist key of the position (int)
+            plies --> plies left to mate in (int)
+
+            return parameter(s):
+            numbers --> (phi, delta) of the position or None if it is not stored
+        """
+        entry = self.entries[(key ^ plies) % self.size]
+        if entry is not None and entry[0] == key and entry[1] == plies:
+            self.hits += 1
+            return entry[2], entry[3]
+        self.misses += 1
+        return None
+
+    def store(self, key, plies, phi, delta, work):
+        """
+            stores the proof and disproof numbers of a position
+
+            input parameter(s):
+            key   --> zobrist key of the position (int)
+            plies --> plies left to mate in (int)
+            phi   --> proof number for the side to move (int)
+            delta --> disproof number for the side to move (int)
+            work  --> nodes searched below the position (int)
+
+            return parameter(s):
+            None
+        """
+        index = (key ^ plies) % self.size
+        entry = self.entries[index]
+        if entry is None or (entry[0] == key and entry[1] == plies) or work >= entry[4]:
+            if entry is not None and (entry[0] != key or entry[1] != plies):
+                self.replacements += 1
+            self.entries[index] = (key, plies, phi, delta, work)
+
+
+class Mate_search_limit(Exception):
+    """
+        raised by the mate search when its node budget has run out
+    """
+
+
+proof_table = Proof_table()
+
+# nodes searched by the current mate search and its budget
+mate_limits = {"nodes": 0, "node_limit": inf}
+
+
+def terminal_numbers(game_state, moves, plies):
+    """
+        proof and disproof numbers of a position the search does not need to expand
+
+        input parameter(s):
+        game_state --> Game_state object
+        moves      --> valid moves of the position
+        plies      --> plies left to mate in (odd: the attacker is to move)
+
+        return parameter(s):
+        numbers --> (phi, delta) for the side to move, or None if the position must be searched
+    """
+    if not moves:
+        if plies % 2 == 0 and not game_state.check_mate:
+            return 0, PROOF_INFINITY  # the defender is stalemated
+        return PROOF_INFINITY, 0  # the defender is mated, or the attacker cannot move
+    if plies == 0:  # the defender is not mated and there are no moves left to mate with
+        return 0, PROOF_INFINITY
+    return None
+
+
+def mid(game_state, plies, phi_threshold, delta_threshold):
+    """
+        df-pn search of a position until its proof number (phi) or disproof number (delta)
+        reaches its threshold. Numbers are from the point of view of the side to move: phi is
+        how many positions at least must be solved to show that it wins (for the attacker:
+        forces mate, for the defender: escapes), delta how many to show that it loses. A
+        position's phi is the smallest delta of its children and its delta the sum of their
+        phis, and the search goes down the child with the smallest delta
+
+        input parameter(s):
+        game_state      --> Game_state object
+        plies           --> plies left to mate in (odd: the attacker is to move)
+        phi_threshold   --> phi at which the search returns (int)
+        delta_threshold --> delta at which the search returns (int)
+
+        return parameter(s):
+        phi   --> proof number of the position for the side to move (int)
+        delta --> disproof number of the position for the side to move (int)
+    """
+    mate_limits["nodes"] += 1
+    if mate_limits["nodes"] >= mate_limits["node_limit"]:
+        raise Mate_search_limit
+
+    key = game_state.zobrist_key
+    start_nodes = mate_limits["nodes"]
+
+    moves = game_state.get_valid_moves()[0]
+    numbers = terminal_numbers(game_state, moves, plies)
+    if numbers is not None:
+        proof_table.store(key, plies, numbers[0], numbers[1], 0)
+        return numbers
+
+    # numbers of the children (1 and 1 for positions not searched yet)
+    children = []
+    for move in moves:
+        game_state.make_move(move, True)
+        children.append(proof_table.probe(game_state.zobrist_key, plies - 1) or (1, 1))
+        game_state.undo_move(True)
+
+    while True:
+        phi, delta = PROOF_INFINITY, 0
+        best, second_delta = 0, PROOF_INFINITY
+        for index, (child_phi, child_delta) in enumerate(children):
+            delta += child_phi
+            if child_delta < phi:
+                best, second_delta, phi = index, phi, child_delta
+            elif child_delta < second_delta:
+                second_delta = child_delta
+        delta = min(delta, PROOF_INFINITY)
+
+        if phi >= phi_threshold or delta >= delta_threshold:
+            proof_table.store(key, plies, phi, delta, mate_limits["nodes"] - start_nodes)
+            return phi, delta
+
+        child_phi = children[best][0]
+        game_state.make_move(moves[best], True)
+        children[best] = mid(game_state, plies - 1,
+                             min(PROOF_INFINITY, delta_threshold + child_phi - delta),
+                             min(phi_threshold, second_delta + 1))
+        game_state.undo_move(True)
+
+
+def mating_line(game_state, plies):
+    """
+        reads the moves of a proven mate back from the proof table: the attacker plays a move
+        to a proven position and the defender the proven lost move that holds out longest
+        (positions proven by the searches of shorter mates are mated sooner)
+
+        input parameter(s):
+        game_state --> Game_state object (attacker to move)
+        plies      --> plies left to mate in (int)
+
+        return parameter(s):
+        line --> list of moves (Move objects) until checkmate. It can be shorter than the
+                 mate when the table does not show how soon a defender reply is mated, or stop
+                 early if a proof entry has been replaced
+    """
+    line = []
+    while plies > 0:
+        # the attacker moves to a position the defender has lost (delta 0), the defender to a
+        # position the attacker has won (phi 0) that is not mated sooner
+        best_move, best_plies = None, 0
+        for move in game_state.get_valid_moves()[0]:
+            game_state.make_move(move, True)
+            numbers = proof_table.probe(game_state.zobrist_key, plies - 1)
+            if numbers is not None and numbers[plies % 2] == 0:
+                if plies % 2:
+                    game_state.undo_move(True)
+                    best_move = move
+                    break
+                mate_plies = plies - 1
+                while mate_plies > 1:
+                    shorter = proof_table.probe(game_state.zobrist_key, mate_plies - 2)
+                    if shorter is None or shorter[0] != 0:
+                        break
+                    mate_plies -= 2
+                if mate_plies > best_plies:
+                    best_move, best_plies = move, mate_plies
+            game_state.undo_move(True)
+
+        if best_move is None:
+            break
+        game_state.make_move(best_move, True)
+        line.append(best_move)
+        plies -= 1
+
+    for move in line:
+        game_state.undo_move(True)
+    return line
+
+
+def find_mate(game_state, max_moves, node_limit=None):
+    """
+        finds the shortest forced checkmate of the side to move within max_moves moves, trying
+        mates in 1, 2, ... moves in turn with a df-pn search (the proof table is cleared first)
+
+        input parameter(s):
+        game_state --> Game_state object
+        max_moves  --> longest mate to look for, in moves of the side to move (int)
+        node_limit --> maximum number of searched nodes or None for no limit. Default is None
+
+        return parameter(s):
+        found --> True (mate found), False (no mate in max_moves moves) or None (the node
+                  budget ran out first)
+        line  --> moves of the mate (Move objects, empty unless found)
+        moves --> the mate is in this many moves (0 unless found)
+    """
+    proof_table.clear()  # positions of different puzzles rarely share entries
+    mate_limits["nodes"] = 0
+    mate_limits["node_limit"] = inf if node_limit is None else node_limit
+    moves_made = len(game_state.move_log)
+
+    for moves in range(1, max_moves + 1):
+        plies = 2 * moves - 1
+        try:
+            phi, delta = mid(game_state, plies, PROOF_INFINITY, PROOF_INFINITY)
+        except Mate_search_limit:
+            # take back the moves of the unfinished search
+            while len(game_state.move_log) > moves_made:
+                game_state.undo_move(True)
+            return None, [], 0
+
+        if phi == 0:
+            return True, mating_line(game_state, plies), moves
+    return False, [], 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proof-number mate solver")
+    parser.add_argument("puzzles", nargs="?", help="file of positions to solve (one FEN per line)")
+    parser.add_argument("--fen", help="solve a single position instead of a file")
+    parser.add_argument("-n", "--moves", type=int, default=3, help="longest mate to look for in moves (default 3)")
+    parser.add_argument("--nodes", type=int, help="node budget of each position (default no limit)")
+    args = parser.parse_args()
+
+    if args.fen:
+        fens = [args.fen]
+    elif args.puzzles:
+        with open(args.puzzles) as puzzle_file:
+            fens = [line.strip() for line in puzzle_file if line.strip() and not line.startswith("#")]
+    else:
+        parser.error("give a puzzle file or --fen")
+
+    total_nodes, total_seconds = 0, 0
+    for fen in fens:
+        gs = Game_state()
+        gs.load_fen(fen)
+        start = time.perf_counter()
+        found, line, moves = find_mate(gs, args.moves, args.nodes)
+        seconds = time.perf_counter() - start
+        total_nodes += mate_limits["nodes"]
+        total_seconds += seconds
+
+        if found:
+            result = "mate in {}: {}".format(moves, " ".join(move.get_coordinate_notation() for move in line))
+        else:
+            result = "no mate in {}".format(args.moves) if found is False else "unknown (node limit)"
+        print("{}\n    {} ({} nodes, {:.2f} seconds)".format(fen, result, mate_limits["nodes"], seconds))
+
+    print("\n{} positions, {} nodes in {:.2f} seconds".format(len(fens), total_nodes, total_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@
     You can select an option by double clicking on it.
 """
 import pygame as pg
-from ai import ai_move, ai_reset
+from ai import ai_move
 from main import main
 import random
 import sys
@@ -18,11 +18,11 @@ screen_height=600
 screen=pg.display.set_mode((screen_width, screen_height))
 font = pg.font.SysFont("Helvetica",75)
 #
-def display_main(choice):
+def display_main(choice, human_side=None):
 	"""
 		Link option To main board
 	"""
-	return main(choice)
+	return main(choice, human_side)
 
 
 def player_format(message, player_size, player_color):
@@ -98,6 +98,9 @@ def main_menu():
 			player_start=player_format("SINGLE PLAYER",  75, green)
 			if mode=="player1":
 				player_start = player_format("SINGLE PLAYER", 75, brown)
+				display_main(False, "l") # human plays light against the AI
+				mode=""
+				player=""
 
 		else:
 			player_start = player_format("SINGLE PLAYER", 75, white)
@@ -0,0 +1,121 @@
+# This is the perft (performance test) suite for the move generator. It counts the
+# leaf nodes of the legal move tree of well known positions, compares them with the
+# published counts and reports the speed in nodes per second
+#
+# usage:
+#   python perft.py                       run the standard positions to depth 3
+#   python perft.py -d 5                  run the standard positions to depth 5
+#   python perft.py -d 4 --fen "<fen>"    perft of a single position
+#   python perft.py -d 4 --fen "<fen>" --divide   node counts split by root move
+
+import argparse
+import sys
+import time
+from engine import Game_state
+
+# (name, FEN, node counts for depth 1, 2, 3, ...)
+# see https://www.chessprogramming.org/Perft_Results
+POSITIONS = (
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     (20, 400, 8902, 197281, 4865609, 119060324)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (48, 2039, 97862, 4085603, 193690690)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     (14, 191, 2812, 43238, 674624, 11030083)),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     (6, 264, 9467, 422333, 15833292)),
+    ("position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     (6, 264, 9467, 422333, 15833292)),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     (44, 1486, 62379, 2103487, 89941194)),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     (46, 2079, 89890, 3894594, 164075551)),
+)
+
+
+def run_perft(gs, depth):
+    """
+        times a perft of a position
+
+        input parameter(s):
+        gs    --> Game_state object
+        depth --> number of plies to search (int)
+
+        return parameter(s):
+        nodes   --> perft node count (int)
+        seconds --> time taken (float)
+    """
+    start = time.perf_counter()
+    nodes = gs.perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def run_suite(max_depth):
+    """
+        runs the standard positions up to a depth and reports every count
+
+        input parameter(s):
+        max_depth --> deepest perft to run for each position (int)
+
+        return parameter(s):
+        mismatches --> number of node counts differing from the published ones (int)
+    """
+    mismatches = 0
+    total_nodes = 0
+    total_seconds = 0
+
+    print("{:<20} {:>5} {:>12} {:>12} {:>8} {:>10} {:>6}".format(
+        "position", "depth", "nodes", "expected", "seconds", "nodes/sec", ""))
+
+    for name, fen, expected in POSITIONS:
+        gs = Game_state()
+        gs.load_fen(fen)
+
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            nodes, seconds = run_perft(gs, depth)
+            total_nodes += nodes
+            total_seconds += seconds
+            correct = nodes == expected[depth - 1]
+            mismatches += not correct
+
+            print("{:<20} {:>5} {:>12} {:>12} {:>8.2f} {:>10.0f} {:>6}".format(
+                name, depth, nodes, expected[depth - 1], seconds,
+                nodes / seconds if seconds else 0, "ok" if correct else "FAIL"))
+
+    print("\n{} nodes in {:.2f} seconds ({:.0f} nodes/sec), {} mismatch(es)".format(
+        total_nodes, total_seconds, total_nodes / total_seconds if total_seconds else 0, mismatches))
+
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move generator perft suite")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="perft depth (default 3)")
+    parser.add_argument("--fen", help="run a single position instead of the standard suite")
+    parser.add_argument("--divide", action="store_true",
+                        help="split the node count of --fen by root move")
+    args = parser.parse_args()
+
+    if not args.fen:
+        sys.exit(1 if run_suite(args.depth) else 0)
+
+    gs = Game_state()
+    gs.load_fen(args.fen)
+
+    if args.divide:
+        start = time.perf_counter()
+        counts = gs.divide(args.depth)
+        seconds = time.perf_counter() - start
+        for move in sorted(counts):
+            print(move, counts[move])
+        nodes = sum(counts.values())
+        print("\n{} moves, {} nodes".format(len(counts), nodes))
+    else:
+        nodes, seconds = run_perft(gs, args.depth)
+        print("perft({}) = {}".format(args.depth, nodes))
+
+    print("{:.2f} seconds ({:.0f} nodes/sec)".format(seconds, nodes / seconds if seconds else 0))
+
+
+if __name__ == "__main__":
+    main()
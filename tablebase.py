@@ -0,0 +1,425 @@
+# This is the endgame tablebase generator of the AI. For a small material configuration
+# (eg king and queen against king) every position is solved by retrograde analysis:
+# starting from the checkmates, positions are resolved backwards one ply at a time, so each
+# position gets its exact result (win, draw or loss for the side to move) and distance to
+# mate. The tables are written to disk and probed by the AI search
+#
+# usage:
+#   python tablebase.py              generate KQK, KRK, KPK and KBNK in tablebases/
+#   python tablebase.py KQK KRK      generate some tables only
+
+import argparse
+import mmap
+import os
+import time
+from engine import Game_state, KING_ATTACKS, KNIGHT_ATTACKS, bishop_attacks, rook_attacks
+
+# directory of the table files (one <material>.bin file per table, eg tablebases/KQK.bin)
+TABLEBASE_DIR = "tablebases"
+TABLEBASE_MATERIALS = ("KQK", "KRK", "KPK", "KBNK")
+
+# material the stronger side cannot win with (drawn whatever the position)
+DRAWN_MATERIALS = ("KK", "KBK", "KNK")
+
+# order of the pieces of the stronger side in material names
+MATERIAL_ORDER = "QRBNP"
+
+
+def table_pieces(material):
+    """
+        pieces of a table in index order. Tables are stored with light as the stronger side:
+        the light king, the other light pieces, then the dark king
+
+        input parameter(s):
+        material --> material of the table, eg "KBNK" (str)
+
+        return parameter(s):
+        pieces --> list of pieces, eg ["kl", "bl", "nl", "kd"]
+    """
+    return ["kl"] + [letter.lower() + "l" for letter in material[1:-1]] + ["kd"]
+
+
+def position_index(squares, light_to_move):
+    """
+        index of a position in its table: the squares of the pieces (in table_pieces order) as
+        a base 64 number, times 2, plus 1 when dark is to move
+
+        input parameter(s):
+        squares       --> square index of each piece (row * 8 + column)
+        light_to_move --> side to move (bool)
+
+        return parameter(s):
+        index --> position of the entry in the table (int)
+    """
+    index = 0
+    for sq in squares:
+        index = index * 64 + sq
+    return index * 2 + (not light_to_move)
+
+
+def decode_value(value):
+    """
+        reads a table entry. An entry is one byte: 0 for a draw, otherwise the distance to mate
+        in plies plus one. The side to move wins when the distance is odd and loses (it is
+        checkmated at the end) when the distance is even
+
+        input parameter(s):
+        value --> table entry (int)
+
+        return parameter(s):
+        result --> 1 (side to move wins), 0 (draw) or -1 (side to move loses)
+        dtm    --> distance to mate in plies (0 for a draw)
+    """
+    if not value:
+        return 0, 0
+    return (1 if value % 2 == 0 else -1), value - 1
+
+
+class Tablebase():
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        """
+            endgame tables read from the table files of a directory. A file is memory mapped
+            the first time its material is probed, missing tables are not probed
+
+            input parameter(s):
+            directory --> directory of the table files. Default is TABLEBASE_DIR
+
+            return parameter(s):
+            None
+        """
+        self.directory = directory
+        self.tables = {}  # material --> mmap of its file (None if there is no file)
+        self.max_pieces = 2 + max(len(material) - 2 for material in TABLEBASE_MATERIALS)
+
+    def get_table(self, material):
+        """
+            opens the table of a material
+
+            input parameter(s):
+            material --> material of the table, eg "KQK" (str)
+
+            return parameter(s):
+            table --> mmap of the table file or None if there is no table
+        """
+        if material not in self.tables:
+            path = os.path.join(self.directory, material + ".bin")
+            table = None
+            if os.path.isfile(path) and os.path.getsize(path) == 2 * 64 ** (len(material)):
+                with open(path, "rb") as table_file:
+                    table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[material] = table
+        return self.tables[material]
+
+    def close(self):
+        """
+            unmaps the table files (they are mapped again by the next probe)
+
+            input parameter(s):
+            None
+
+            return parameter(s):
+            None
+        """
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def probe(self, gs):
+        """
+            looks up a position of a lone king against a few pieces (without castling rights)
+
+            input parameter(s):
+            gs --> Game_state object
+
+            return parameter(s):
+            result --> (result, dtm) for the side to move (see decode_value) or None if the
+                       position is not in a table
+        """
+        light, dark = gs.occupancy["l"], gs.occupancy["d"]
+        if bin(light | dark).count("1") > self.max_pieces or gs.castling_rights:
+            return None
+
+        if light & (light - 1) == 0:  # light has its king only, dark is the stronger side
+            if dark & (dark - 1) == 0:
+                return 0, 0
+            strong, flip, light_to_move = "d", 56, not gs.light_to_move
+        elif dark & (dark - 1) == 0:
+            strong, flip, light_to_move = "l", 0, gs.light_to_move
+        else:
+            return None
+
+        material = "K" + "".join(letter * len(gs.piece_squares[letter.lower() + strong])
+                                 for letter in MATERIAL_ORDER) + "K"
+        if material in DRAWN_MATERIALS:
+            return 0, 0
+        table = self.get_table(material)
+        if table is None:
+            return None
+
+        # squares in table order (mirrored when dark is the stronger side)
+        weak = "l" if strong == "d" else "d"
+        on_board, squares = {}, []
+        for piece in table_pieces(material):
+            piece = piece[0] + (strong if piece[1] == "l" else weak)
+            if piece not in on_board:
+                on_board[piece] = sorted(gs.piece_squares[piece])
+            squares.append(on_board[piece].pop() ^ flip)
+        return decode_value(table[position_index(squares, light_to_move)])
+
+
+def material_after(material, removed=None, added=None):
+    """
+        material left after a piece of the stronger side is captured or a pawn promotes
+
+        input parameter(s):
+        material --> material of the table, eg "KPK" (str)
+        removed  --> piece letter taken off, eg "P". Default is None
+        added    --> piece letter put on, eg "Q". Default is None
+
+        return parameter(s):
+        material --> material name with the pieces in MATERIAL_ORDER (str)
+    """
+    pieces = list(material[1:-1])
+    if removed:
+        pieces.remove(removed)
+    if added:
+        pieces.append(added)
+    return "K" + "".join(sorted(pieces, key=MATERIAL_ORDER.index)) + "K"
+
+
+def unmoves(pieces, squares, light_moved, occupied):
+    """
+        finds the positions a position can be reached from by a move that neither captures nor
+        promotes (the retrograde moves of the side that has just moved)
+
+        input parameter(s):
+        pieces      --> pieces of the table (table_pieces)
+        squares     --> square of each piece
+        light_moved --> the side that made the last move is light (bool)
+        occupied    --> bitboard of all pieces (int)
+
+        return parameter(s):
+        positions --> generator of lists of squares (one per previous position)
+    """
+    empty = ~occupied
+    for slot, piece in enumerate(pieces):
+        if (piece[1] == "l") != light_moved:
+            continue
+        sq = squares[slot]
+        kind = piece[0]
+
+        if kind == "k":
+            origins = KING_ATTACKS[sq] & empty
+        elif kind == "n":
+            origins = KNIGHT_ATTACKS[sq] & empty
+        elif kind == "b":
+            origins = bishop_attacks(sq, occupied) & empty
+        elif kind == "r":
+            origins = rook_attacks(sq, occupied) & empty
+        elif kind == "q":
+            origins = (bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)) & empty
+        else:  # light pawns move up the board (towards row 0)
+            origins = 0
+            if sq >> 3 <= 5 and empty >> (sq + 8) & 1:
+                origins = 1 << (sq + 8)
+                if sq >> 3 == 4 and empty >> (sq + 16) & 1:
+                    origins |= 1 << (sq + 16)
+
+        while origins:
+            origin = (origins & -origins).bit_length() - 1
+            origins &= origins - 1
+            previous = list(squares)
+            previous[slot] = origin
+            yield previous
+
+
+def generate(material, directory=TABLEBASE_DIR, verbose=True):
+    """
+        solves every position of a material configuration by retrograde analysis and writes
+        its table. First every legal position gets its number of valid moves (with the rules
+        of Game_state) and the checkmates are found. Then, one ply at a time, the positions
+        that can move into a lost position are won, and the positions whose moves all lead to
+        won positions are lost. Positions never resolved are draws. Captures and promotions
+        leave the table: their results are read from the tables of the material after them,
+        which are generated first if needed
+
+        input parameter(s):
+        material  --> material of the table with light as the stronger side, eg "KQK" (str)
+        directory --> directory the table is written to. Default is TABLEBASE_DIR
+        verbose   --> print progress. Default is True
+
+        return parameter(s):
+        table --> the table (bytearray, one entry per position_index, see decode_value)
+    """
+    start = time.perf_counter()
+    pieces = table_pieces(material)
+    size = 2 * 64 ** len(pieces)
+    counts = bytearray(size)  # valid moves of each legal position still to be refuted
+    values = bytearray(size)
+    frontier = {0: []}  # distance to mate --> positions resolved at that distance
+    exits = {}  # distance --> positions with a capture or promotion resolved at that distance
+
+    # tables of the material left after captures and promotions
+    subtables = {}
+    for letter in material[1:-1]:
+        targets = [material_after(material, removed=letter)]
+        if letter == "P":
+            targets += [material_after(material, "P", promoted) for promoted in "QRBN"]
+        for target in targets:
+            if target not in DRAWN_MATERIALS and target not in subtables:
+                path = os.path.join(directory, target + ".bin")
+                if os.path.isfile(path):
+                    with open(path, "rb") as table_file:
+                        subtables[target] = table_file.read()
+                else:
+                    subtables[target] = generate(target, directory, verbose)
+
+    gs = Game_state()
+    gs.load_fen("8/8/8/8/8/8/8/8 w - - 0 1")
+    placed = [None] * len(pieces)
+    light_king, dark_king = 0, len(pieces) - 1
+
+    for index in range(0, size, 2):
+        squares = []
+        rest = index >> 1
+        for slot in range(len(pieces)):
+            rest, sq = divmod(rest, 64)
+            squares.append(sq)
+        squares.reverse()
+
+        if len(set(squares)) < len(squares) or KING_ATTACKS[squares[light_king]] >> squares[dark_king] & 1 or \
+                any(piece[0] == "p" and squares[slot] >> 3 in (0, 7) for slot, piece in enumerate(pieces)):
+            continue
+
+        # move the pieces whose square changed since the previous position
+        for slot, piece in enumerate(pieces):
+            if placed[slot] is not None and placed[slot] != squares[slot]:
+                gs.remove_piece(piece, placed[slot])
+                placed[slot] = None
+        for slot, piece in enumerate(pieces):
+            if placed[slot] is None:
+                gs.put_piece(piece, squares[slot])
+                placed[slot] = squares[slot]
+
+        for light_to_move in (True, False):
+            # the side that is not to move cannot be in check
+            if light_to_move and gs.attackers_to(squares[dark_king], "l", gs.occupancy["l"] | gs.occupancy["d"]):
+                continue
+
+            gs.light_to_move = light_to_move
+            position = index + (not light_to_move)
+            moves = gs.get_valid_moves()[0]
+            if not moves:
+                if gs.check_mate:
+                    values[position] = 1
+                    frontier[0].append(position)
+                continue
+            counts[position] = len(moves)
+
+            for move in moves:
+                if move.piece_captured == "  " and not move.promotion:
+                    continue
+
+                # the move leaves the table: read its result from the table of the material after it
+                if move.promotion:
+                    target = material_after(material, "P", move.promotion.upper())
+                else:
+                    target = material_after(material, removed=move.piece_captured[0].upper())
+                if target in DRAWN_MATERIALS:
+                    continue  # a draw: the position can never be lost
+
+                start_sq, end_sq = move.start_row * 8 + move.start_col, move.end_row * 8 + move.end_col
+                after = {}
+                for slot, piece in enumerate(pieces):
+                    sq = squares[slot]
+                    if sq == end_sq:  # captured
+                        continue
+                    if sq == start_sq:
+                        sq, piece = end_sq, (move.promotion + "l" if move.promotion else piece)
+                    after.setdefault(piece, []).append(sq)
+                child_squares = [after[piece].pop() for piece in table_pieces(target)]
+                result, dtm = decode_value(subtables[target][position_index(child_squares, not light_to_move)])
+
+                if result < 0:  # the opponent is mated after this move
+                    exits.setdefault(dtm + 1, []).append((position, True))
+                elif result > 0:  # this move loses, once every other move does too
+                    exits.setdefault(dtm, []).append((position, False))
+
+    if verbose:
+        print("{}: {} checkmates, {:.1f} seconds".format(material, len(frontier[0]), time.perf_counter() - start))
+
+    distance = 0
+    while frontier.get(distance) or exits:
+        if distance > 253:
+            raise ValueError(material + ": mates longer than 254 plies do not fit a table entry")
+        resolved = frontier.setdefault(distance, [])
+        following = frontier.setdefault(distance + 1, [])
+
+        # moves out of the table resolved at this distance
+        for position, wins in exits.pop(distance, []):
+            if values[position]:
+                continue
+            if wins:
+                values[position] = distance + 1
+                resolved.append(position)
+            else:
+                counts[position] -= 1
+                if not counts[position]:
+                    values[position] = distance + 2
+                    following.append(position)
+
+        for position in resolved:
+            light_to_move = not position & 1
+            lost = distance % 2 == 0
+            squares = []
+            rest = position >> 1
+            for slot in range(len(pieces)):
+                rest, sq = divmod(rest, 64)
+                squares.append(sq)
+            squares.reverse()
+            occupied = 0
+            for sq in squares:
+                occupied |= 1 << sq
+
+            for previous_squares in unmoves(pieces, squares, not light_to_move, occupied):
+                previous = position_index(previous_squares, not light_to_move)
+                if values[previous] or not counts[previous]:
+                    continue
+                if lost:
+                    values[previous] = distance + 2
+                    following.append(previous)
+                else:
+                    counts[previous] -= 1
+                    if not counts[previous]:
+                        values[previous] = distance + 2
+                        following.append(previous)
+
+        del frontier[distance]
+        distance += 1
+
+    if verbose:
+        print("{}: solved, longest mate {} plies, {:.1f} seconds".format(
+            material, max(values) - 1, time.perf_counter() - start))
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, material + ".bin"), "wb") as table_file:
+        table_file.write(values)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebase generator")
+    parser.add_argument("materials", nargs="*", default=TABLEBASE_MATERIALS,
+                        help="materials to solve, eg KQK (default {})".format(" ".join(TABLEBASE_MATERIALS)))
+    parser.add_argument("-o", "--output", default=TABLEBASE_DIR,
+                        help="directory of the table files (default {})".format(TABLEBASE_DIR))
+    args = parser.parse_args()
+
+    for material in args.materials:
+        generate(material.upper(), args.output)
+
+
+if __name__ == "__main__":
+    main()